@@ -4,7 +4,7 @@ from django.utils.timezone import make_aware
 from pytz import AmbiguousTimeError, NonExistentTimeError
 
 from zds.utils.feeds import DropControlCharsRss201rev2Feed, DropControlCharsAtom1Feed
-from .models import Post, Topic
+from .models import Forum, Post, Topic
 
 
 class ItemMixin:
@@ -47,7 +47,7 @@ class LastPostsFeedRSS(Feed, ItemMixin):
 
     def items(self, obj):
         try:
-            posts = Post.objects.filter(topic__forum__groups__isnull=True)
+            posts = Post.objects.filter(topic__forum__pk__in=Forum.objects.get_authorized_forums_pks(None))
             if "forum" in obj:
                 posts = posts.filter(topic__forum__pk=int(obj["forum"]))
             if "tag" in obj:
@@ -80,7 +80,7 @@ class LastTopicsFeedRSS(Feed, ItemMixin):
 
     def items(self, obj):
         try:
-            topics = Topic.objects.filter(forum__groups__isnull=True)
+            topics = Topic.objects.filter(forum__pk__in=Forum.objects.get_authorized_forums_pks(None))
             if "forum" in obj:
                 topics = topics.filter(forum__pk=int(obj["forum"]))
             if "tag" in obj:
@@ -1,4 +1,8 @@
+import time
+from uuid import uuid4
+
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.db.models import Q, F
 from model_utils.managers import InheritanceManager
@@ -42,6 +46,59 @@ class ForumManager(models.Manager):
             .all()
         )
 
+    authorized_forums_version_key = "forum-authorized-forums-version"
+    _authorized_forums = {}
+    _authorized_forums_version = (None, 0)  # the version, and when it was read from the shared cache
+
+    def get_authorized_forums_pks(self, user):
+        """Get the pks of the forums a user is allowed to read.
+
+        The result only depends on the groups of the user, so it is kept in memory for each combination of groups
+        (anonymous users having none), until a forum or the groups of a forum change (see
+        ``clear_authorized_forums_cache()``).
+
+        :param user: the user (possibly anonymous or ``None``)
+        :type user: django.contrib.auth.models.User
+        :rtype: frozenset
+        """
+
+        group_pks = ()
+        if user and user.is_authenticated:
+            group_pks = tuple(sorted(user.profile.group_pks))
+
+        version = self.get_authorized_forums_version()
+        cached_version, forum_pks = self._authorized_forums.get(group_pks, (None, None))
+        if cached_version != version:
+            query = Q(groups__isnull=True)
+            if group_pks:
+                query |= Q(groups__in=group_pks)
+            forum_pks = frozenset(self.filter(query).values_list("pk", flat=True))
+            self._authorized_forums[group_pks] = (version, forum_pks)
+
+        return forum_pks
+
+    def get_authorized_forums_version(self):
+        """Get the version of the authorized forums, which is read from the shared cache at most once every
+        ``ZDS_APP["forum"]["authorized_forums_version_ttl"]`` seconds by each process.
+
+        :rtype: str
+        """
+
+        version, read_at = self._authorized_forums_version
+        if version is None or time.monotonic() - read_at > settings.ZDS_APP["forum"]["authorized_forums_version_ttl"]:
+            version = cache.get_or_set(self.authorized_forums_version_key, uuid4().hex, timeout=None)
+            ForumManager._authorized_forums_version = (version, time.monotonic())
+        return version
+
+    def clear_authorized_forums_cache(self):
+        """Make the authorized forums computed by ``get_authorized_forums_pks()`` obsolete, at once in this process
+        and after ``ZDS_APP["forum"]["authorized_forums_version_ttl"]`` seconds at most in the others.
+        """
+
+        version = uuid4().hex
+        cache.set(self.authorized_forums_version_key, version, timeout=None)
+        ForumManager._authorized_forums_version = (version, time.monotonic())
+
 
 class TopicManager(models.Manager):
     """
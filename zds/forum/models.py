@@ -7,13 +7,19 @@ from django.contrib.auth.models import Group, User, AnonymousUser
 from django.urls import reverse
 from django.db import models
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 
-from elasticsearch_dsl.field import Text, Keyword, Integer, Boolean, Float, Date
+from elasticsearch_dsl.field import Text, Keyword, Integer, Boolean, Float, Date, Completion
 
 from zds.forum.managers import TopicManager, ForumManager, PostManager, TopicReadManager
 from zds.forum import signals
-from zds.searchv2.models import AbstractESDjangoIndexable, delete_document_in_elasticsearch, ESIndexManager
+from zds.searchv2.models import (
+    AbstractESDjangoIndexable,
+    delete_document_in_elasticsearch,
+    get_completion_inputs,
+    get_completion_weight,
+    get_index_manager,
+)
 from zds.utils import get_current_user, old_slugify
 from zds.utils.models import Comment, Tag
 
@@ -169,6 +175,15 @@ class Forum(models.Model):
         return self._nb_group > 0
 
 
+@receiver(post_save, sender=Forum)
+@receiver(post_delete, sender=Forum)
+@receiver(m2m_changed, sender=Forum.groups.through)
+@receiver(post_delete, sender=Group)
+def clear_authorized_forums_cache(sender, **kwargs):
+    """The forums a group of users is allowed to read may have changed (deleting a group may make a forum public)"""
+    Forum.objects.clear_authorized_forums_cache()
+
+
 class Topic(AbstractESDjangoIndexable):
     """
     A Topic is a thread of posts.
@@ -445,6 +460,11 @@ class Topic(AbstractESDjangoIndexable):
         es_mapping.field("pubdate", Date())
         es_mapping.field("forum_pk", Integer())
 
+        # for the autocompletion of the titles, restricted to the forums the user is allowed to visit:
+        es_mapping.field(
+            "topic_title_suggest", Completion(contexts=[{"name": "forum_pk", "type": "category", "path": "forum_pk"}])
+        )
+
         # not indexed:
         es_mapping.field("get_absolute_url", Keyword(index=False))
         es_mapping.field("forum_title", Text(index=False))
@@ -463,10 +483,19 @@ class Topic(AbstractESDjangoIndexable):
         """Overridden to handle the case of tags (M2M field)"""
 
         excluded_fields = excluded_fields or []
-        excluded_fields.extend(["tags", "forum_pk", "forum_title", "forum_get_absolute_url"])
+        excluded_fields.extend(["tags", "forum_pk", "forum_title", "forum_get_absolute_url", "topic_title_suggest"])
 
         data = super().get_es_document_source(excluded_fields=excluded_fields)
         data["tags"] = [tag.title for tag in self.tags.all()]
+        boosts = settings.ZDS_APP["search"]["boosts"]["topic"]
+        data["topic_title_suggest"] = {
+            "input": get_completion_inputs(self.title),
+            "weight": get_completion_weight(
+                boosts["if_solved"] if self.is_solved else 1,
+                boosts["if_sticky"] if self.is_sticky else 1,
+                boosts["if_locked"] if self.is_locked else 1,
+            ),
+        }
         data["forum_pk"] = self.forum.pk
         data["forum_title"] = self.forum.title
         data["forum_get_absolute_url"] = self.forum.get_absolute_url()
@@ -524,7 +553,9 @@ class Post(Comment, AbstractESDjangoIndexable):
     def get_es_mapping(cls):
         es_mapping = super().get_es_mapping()
 
-        es_mapping.field("text_html", Text())
+        # only needed for the matching and the highlighting, so stored aside rather than in `_source`:
+        es_mapping.field("text_html", Text(store=True))
+        es_mapping.meta("_source", excludes=["text_html"])
         es_mapping.field("is_useful", Boolean())
         es_mapping.field("is_visible", Boolean())
         es_mapping.field("position", Integer())
@@ -577,7 +608,7 @@ class Post(Comment, AbstractESDjangoIndexable):
 
         super().hide_comment_by_user(user, text_hidden)
 
-        index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        index_manager = get_index_manager()
         index_manager.update_single_document(self, {"is_visible": False})
 
 
@@ -1210,6 +1210,31 @@ class ManagerTests(TestCase):
         self.assertTrue(topic.is_read_by_user(self.staff.user, check_auth=False))
         self.assertFalse(topic.is_read_by_user(reader.user, check_auth=False))
 
+    def test_get_authorized_forums_pks(self):
+        user = ProfileFactory().user
+        public_forums = {self.forum1.pk, self.forum2.pk}
+
+        self.assertEqual(Forum.objects.get_authorized_forums_pks(None), public_forums)
+        self.assertEqual(Forum.objects.get_authorized_forums_pks(user), public_forums)
+        self.assertEqual(Forum.objects.get_authorized_forums_pks(self.staff.user), public_forums | {self.forum3.pk})
+
+        # computed once per combination of groups, the groups of the user being kept by its profile
+        with self.assertNumQueries(0):
+            Forum.objects.get_authorized_forums_pks(self.staff.user)
+
+        # changes of the forums are taken into account
+        self.forum2.groups.add(Group.objects.filter(name="staff").first())
+        self.assertEqual(Forum.objects.get_authorized_forums_pks(user), {self.forum1.pk})
+
+        forum4 = ForumFactory(category=self.cat1)
+        self.assertEqual(Forum.objects.get_authorized_forums_pks(None), {self.forum1.pk, forum4.pk})
+
+        group = Group.objects.create(name="Les illuminatis anonymes de ZdS")
+        forum4.groups.add(group)
+        self.assertEqual(Forum.objects.get_authorized_forums_pks(None), {self.forum1.pk})
+        group.delete()
+        self.assertEqual(Forum.objects.get_authorized_forums_pks(None), {self.forum1.pk, forum4.pk})
+
 
 class TopicReadAndUnreadTests(TestCase):
     def setUp(self):
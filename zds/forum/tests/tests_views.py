@@ -13,6 +13,7 @@ from zds.forum.models import Topic, Post
 from zds.notification.models import TopicAnswerSubscription
 from zds.member.tests.factories import DevProfileFactory, ProfileFactory, StaffProfileFactory
 from zds.utils.models import CommentEdit, Hat
+from zds.utils.templatetags.emarkdown import prerendered_markdown
 
 
 class LastTopicsViewTests(TestCase):
@@ -273,6 +274,20 @@ class TopicPostsListViewTest(TestCase):
         self.assertEqual(200, response.status_code)
         self.assertEqual(1, response.context["subscriber_count"])
 
+    def test_signatures_are_rendered_at_once(self):
+        profile = ProfileFactory(sign="Ma *signature*")
+        other_profile = ProfileFactory(sign="Une autre signature")
+        _, forum = create_category_and_forum()
+        topic = create_topic_in_forum(forum, profile)
+        PostFactory(topic=topic, author=other_profile.user, position=2)
+        PostFactory(topic=topic, author=profile.user, position=3)
+
+        with patch("zds.utils.mixins.prerendered_markdown", wraps=prerendered_markdown) as mock_prerendered:
+            response = self.client.get(reverse("forum:topic-posts-list", args=[topic.pk, topic.slug()]))
+
+        self.assertEqual(200, response.status_code)
+        mock_prerendered.assert_called_once_with({"Ma *signature*", "Une autre signature"}, inline=True)
+
 
 class TopicNewTest(TestCase):
     def test_failure_create_topic_with_a_post_with_client_unauthenticated(self):
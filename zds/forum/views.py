@@ -28,7 +28,7 @@ from zds.featured.mixins import FeatureableMixin
 from zds.utils import old_slugify
 from zds.utils.context_processor import get_repository_url
 from zds.forum.utils import create_topic, send_post, CreatePostView
-from zds.utils.mixins import FilterMixin
+from zds.utils.mixins import FilterMixin, PrerenderedSignaturesMixin
 from zds.utils.models import Alert, Tag, CommentVote
 from zds.utils.paginator import ZdSPagingListView
 
@@ -168,9 +168,10 @@ class ForumTopicsListView(FilterMixin, ForumEditMixin, ZdSPagingListView, Update
         return queryset
 
 
-class TopicPostsListView(ZdSPagingListView, FeatureableMixin, SingleObjectMixin):
+class TopicPostsListView(PrerenderedSignaturesMixin, ZdSPagingListView, FeatureableMixin, SingleObjectMixin):
 
     context_object_name = "posts"
+    messages_context_name = "posts"
     paginate_by = settings.ZDS_APP["forum"]["posts_per_page"]
     template_name = "forum/topic/index.html"
     object = None
@@ -0,0 +1,19 @@
+from django.conf import settings
+
+from zds.searchv2.models import buffered_es_operations
+
+
+class BufferESOperationsMiddleware:
+    """Send the deletions and partial updates of documents made in the search index during a request in a single
+    bulk request, once the request is processed (see ``buffered_es_operations()``).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.ZDS_APP["search"]["buffer_operations"]:
+            return self.get_response(request)
+
+        with buffered_es_operations():
+            return self.get_response(request)
@@ -0,0 +1,134 @@
+from collections import Counter
+import logging
+import time
+
+from django.conf import settings
+
+from elasticsearch import ConnectionError, TransportError
+from elasticsearch.helpers import expand_action
+
+logger = logging.getLogger(__name__)
+
+REJECTED_STATUS_CODE = 429
+
+
+class BulkController:
+    """Send bulk actions to ES while adapting the size of the bulk requests to the load of the cluster.
+
+    The number of documents per request follows an additive-increase/multiplicative-decrease scheme: it grows by
+    ``additive_step`` after each request answered within ``target_latency`` seconds and is multiplied by
+    ``decrease_factor`` after a slow request or when documents are rejected (HTTP 429,
+    ``es_rejected_execution_exception``). Rejected documents are sent again with an exponential backoff, up to
+    ``max_retries`` times. Requests are also capped to ``max_bytes`` bytes.
+
+    The parameters are taken from ``ZDS_APP["search"]["bulk"]``.
+    """
+
+    def __init__(self, es):
+        """
+        :param es: the Elasticsearch client
+        :type es: elasticsearch.Elasticsearch
+        """
+
+        self.es = es
+        self.config = settings.ZDS_APP["search"]["bulk"]
+        self.batch_size = self.config["initial_batch_size"]
+        self.stats = Counter()
+        self.started_at = time.monotonic()
+
+    def _serialize(self, document):
+        action, data = expand_action(document)
+        op_type, meta = next(iter(action.items()))
+        serializer = self.es.transport.serializer
+        payload = serializer.dumps(action) + "\n"
+        if data is not None:
+            payload += serializer.dumps(data) + "\n"
+        return meta.get("_id"), payload
+
+    def _next_chunk(self, pending):
+        size = 0
+        for count, (_, (_, payload)) in enumerate(pending):
+            size += len(payload.encode("utf-8"))
+            if count >= self.batch_size or (count > 0 and size > self.config["max_bytes"]):
+                return pending[:count], pending[count:]
+        return pending, []
+
+    def _send(self, chunk):
+        """Send a bulk request, retrying it as a whole if the cluster is unreachable or overloaded."""
+
+        body = "".join(payload for _, (_, payload) in chunk)
+        for attempt in range(self.config["max_retries"] + 1):
+            then = time.monotonic()
+            try:
+                response = self.es.bulk(body=body, request_timeout=self.config["request_timeout"])
+            except (ConnectionError, TransportError) as e:
+                status = getattr(e, "status_code", None)
+                if attempt == self.config["max_retries"] or status not in (REJECTED_STATUS_CODE, "N/A", None):
+                    raise
+                self.stats["rejected_requests"] += 1
+                self.decrease()
+                self.wait(attempt)
+            else:
+                latency = time.monotonic() - then
+                self.stats["requests"] += 1
+                self.stats["bytes"] += len(body.encode("utf-8"))
+                self.stats["latency"] += latency
+                return response["items"], latency
+
+    def send(self, documents):
+        """Send ``documents``, which are actions as formatted by ``get_es_document_as_bulk_action()``.
+
+        :param documents: the actions
+        :type documents: list
+        :return: the ``_id`` of the documents that could not be indexed
+        :rtype: set
+        """
+
+        pending = [(0, self._serialize(document)) for document in documents]
+        failed = set()
+
+        while pending:
+            chunk, pending = self._next_chunk(pending)
+            items, latency = self._send(chunk)
+
+            rejected = []
+            for (retries, (document_id, payload)), item in zip(chunk, items):
+                op_type, result = next(iter(item.items()))
+                status = result.get("status", 500)
+                if 200 <= status < 300:
+                    self.stats["documents"] += 1
+                    logger.debug("%s %s with id %s", op_type, result.get("_type"), result.get("_id"))
+                elif status == REJECTED_STATUS_CODE and retries < self.config["max_retries"]:
+                    rejected.append((retries + 1, (document_id, payload)))
+                else:
+                    self.stats["failed"] += 1
+                    failed.add(document_id if document_id is not None else result.get("_id"))
+                    logger.error("unable to %s document %s: %s", op_type, result.get("_id"), result.get("error"))
+
+            if rejected:
+                self.stats["rejected"] += len(rejected)
+                self.decrease()
+                self.wait(max(retries for retries, _ in rejected) - 1)
+                pending = rejected + pending
+            elif latency > self.config["target_latency"]:
+                self.decrease()
+            else:
+                self.batch_size = min(self.batch_size + self.config["additive_step"], self.config["max_batch_size"])
+
+        return failed
+
+    def decrease(self):
+        self.batch_size = max(int(self.batch_size * self.config["decrease_factor"]), self.config["min_batch_size"])
+
+    def wait(self, attempt):
+        time.sleep(self.config["backoff"] * 2**attempt)
+
+    def get_throughput(self):
+        """Return the number of documents indexed per second, and the mean latency of the bulk requests.
+
+        :rtype: tuple
+        """
+
+        elapsed = (time.monotonic() - self.started_at) or 1
+        mean_latency = self.stats["latency"] / self.stats["requests"] if self.stats["requests"] else 0
+        return self.stats["documents"] / elapsed, mean_latency
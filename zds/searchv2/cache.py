@@ -0,0 +1,196 @@
+import copy
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from elasticsearch_dsl.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache_config():
+    return settings.ZDS_APP["search"]["results_cache"]
+
+
+def _generation_key(index):
+    return f"search-generation:{index}"
+
+
+def get_generation(index):
+    """Return the generation of ``index``, which is part of the keys of the cached results.
+
+    :rtype: int
+    """
+
+    try:
+        return caches[get_cache_config()["backend"]].get_or_set(_generation_key(index), 0, timeout=None)
+    except Exception:
+        logger.warning("Unable to read the search cache generation", exc_info=True)
+        return None
+
+
+def invalidate_cached_results(index):
+    """Make the cached results of searches in ``index`` obsolete, by increasing its generation."""
+
+    backend = caches[get_cache_config()["backend"]]
+    key = _generation_key(index)
+    try:
+        backend.incr(key)
+    except ValueError:  # not set yet
+        backend.set(key, 1, timeout=None)
+    except Exception:
+        logger.warning("Unable to invalidate the search cache", exc_info=True)
+
+
+class CachedSearch:
+    """Wrap a ``elasticsearch_dsl.Search`` so that its count and its responses (thus, the pages of a paginator) are
+    cached for ``ZDS_APP["search"]["results_cache"]["timeout"]`` seconds.
+
+    The cache key is built from ``key_parts`` (which must identify the search, including the visibility of the
+    results for the user) and from the generation of the index, increased each time the index is refreshed. Slicing
+    gives another ``CachedSearch``, sharing the same key (and the responses already received).
+
+    If ``count_slice`` is given, the count is obtained by executing this slice of the search (which is usually the
+    page to display), rather than by a separate count request.
+    """
+
+    def __init__(self, search, index, key_parts, count_slice=None):
+        """
+        :param search: the search, set up with ``ESIndexManager.setup_search()``
+        :type search: elasticsearch_dsl.Search
+        :param index: the searched index
+        :type index: str
+        :param key_parts: JSON serializable values that identify the search
+        :type key_parts: list
+        :param count_slice: the slice to execute to get the count
+        :type count_slice: slice
+        """
+
+        self.search = search
+        self.count_slice = count_slice
+        self.config = get_cache_config()
+        self.backend = caches[self.config["backend"]]
+        self._responses = {}
+
+        generation = get_generation(index) if self.config["enabled"] else None
+        self.key = None
+        if generation is not None:
+            payload = json.dumps([index, generation, key_parts], sort_keys=True, default=str)
+            self.key = "search-results:{}".format(hashlib.sha256(payload.encode("utf-8")).hexdigest())
+
+    def _get(self, suffix):
+        if self.key is None:
+            return None
+        try:
+            return self.backend.get(f"{self.key}:{suffix}")
+        except Exception:
+            logger.warning("Unable to read the search cache", exc_info=True)
+            return None
+
+    def _set(self, suffix, value):
+        if self.key is None:
+            return
+        try:
+            self.backend.set(f"{self.key}:{suffix}", value, timeout=self.config["timeout"])
+        except Exception:
+            logger.warning("Unable to write to the search cache", exc_info=True)
+
+    def count(self):
+        count = self._get("count")
+        if count is None:
+            if self.count_slice is not None:
+                return self[self.count_slice].execute().hits.total
+            count = self.search.count()
+            self._set("count", count)
+        return count
+
+    def execute(self):
+        """Return the response of the search, from the cache if possible.
+
+        :rtype: elasticsearch_dsl.response.Response
+        """
+
+        suffix = "{}:{}".format(self.search._extra.get("from"), self.search._extra.get("size"))
+        if suffix in self._responses:
+            return self._responses[suffix]
+
+        raw = self._get(suffix)
+        if raw is None:
+            response = self.search.execute()
+            self._set(suffix, response.to_dict())
+            # the total is given with the results, no need for a count request for the other pages
+            self._set("count", response.hits.total)
+        else:
+            response = Response(self.search, raw)
+
+        self._responses[suffix] = response
+        return response
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k : k + 1].execute()[0]
+
+        count_slice = self.count_slice
+        if count_slice is not None and k.start == count_slice.start and (k.stop or 0) < count_slice.stop:
+            # the paginator cuts the last page to the count, which gives the same results as the full page
+            if k.stop is not None and k.stop >= self.count():
+                k = count_slice
+
+        sliced = copy.copy(self)
+        sliced.search = self.search[k]
+        return sliced
+
+    def __iter__(self):
+        return iter(self.execute())
+
+    def __len__(self):
+        return len(self.execute())
+
+
+def get_completions(index_manager, field, prefix, size, contexts=None, source=None):
+    """Return ``index_manager.suggest()``, cached per prefix for
+    ``ZDS_APP["search"]["autocompletion"]["cache_timeout"]`` seconds (or until the index is refreshed).
+
+    :param index_manager: the manager of the index
+    :type index_manager: zds.searchv2.models.ESIndexManager
+    :param field: the completion field
+    :type field: str
+    :param prefix: the beginning of the text, as typed by the user
+    :type prefix: str
+    :param size: the maximum number of documents
+    :type size: int
+    :param contexts: restrict the documents to these contexts
+    :type contexts: dict
+    :param source: the fields of the documents to return
+    :type source: list
+    :rtype: list
+    """
+
+    prefix = " ".join(prefix.lower().split())
+    timeout = settings.ZDS_APP["search"]["autocompletion"]["cache_timeout"]
+
+    generation = get_generation(index_manager.index) if get_cache_config()["enabled"] and timeout else None
+    if generation is None:
+        return index_manager.suggest(field, prefix, size, contexts, source)
+
+    payload = json.dumps([index_manager.index, generation, field, prefix, size, contexts, source], sort_keys=True)
+    key = "search-completions:{}".format(hashlib.sha256(payload.encode("utf-8")).hexdigest())
+    backend = caches[get_cache_config()["backend"]]
+
+    try:
+        documents = backend.get(key)
+    except Exception:
+        logger.warning("Unable to read the search cache", exc_info=True)
+        documents = None
+
+    if documents is None:
+        documents = index_manager.suggest(field, prefix, size, contexts, source)
+        try:
+            backend.set(key, documents, timeout=timeout)
+        except Exception:
+            logger.warning("Unable to write to the search cache", exc_info=True)
+
+    return documents
@@ -1,9 +1,38 @@
+import json
+import multiprocessing
+import os
+import time
+
+from django.apps import apps
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Min
 
-from zds.searchv2.models import ESIndexManager, get_django_indexable_objects
+from zds.searchv2 import setup_es_connections
+from zds.searchv2.models import ESIndexManager, ESIndexOutbox, get_django_indexable_objects
 from zds.tutorialv2.models.database import FakeChapter
 
+_worker_index_manager = None
+
+
+def _init_worker():
+    """Give its own connections to each worker process."""
+
+    global _worker_index_manager
+    connections.close_all()
+    setup_es_connections()
+    _worker_index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+
+
+def _index_partition(partition):
+    model_label, start, stop = partition
+    model = apps.get_model(model_label)
+    indexed_counter = _worker_index_manager.es_bulk_indexing_of_model(
+        model, force_reindexing=True, pks=range(start, stop)
+    )
+    return partition, indexed_counter
+
 
 class Command(BaseCommand):
     help = "Index data in ES and manage them"
@@ -26,7 +55,39 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "action", type=str, help="action to perform", choices=["setup", "clear", "index_all", "index_flagged"]
+            "action",
+            type=str,
+            help="action to perform",
+            choices=["setup", "clear", "index_all", "reindex", "index_flagged", "index_outbox", "outbox_status"],
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="with index_outbox, keep processing the outbox until interrupted"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=2, help="with --loop, seconds to wait when the outbox is empty"
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="with index_all, number of worker processes indexing partitions of the models in parallel",
+        )
+        parser.add_argument(
+            "--partition-size",
+            type=int,
+            default=10000,
+            help="with index_all and --processes, number of primary keys in each partition",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="with index_all and --processes, only index the partitions not completed by the previous run",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.ZDS_APP["search"]["outbox_batch_size"],
+            help="with index_outbox and reindex, number of outbox entries processed at once",
         )
 
     def handle(self, *args, **options):
@@ -35,10 +96,18 @@ class Command(BaseCommand):
             self.setup_es()
         elif options["action"] == "clear":
             self.clear_es()
+        elif options["action"] == "index_all" and options["processes"] > 1:
+            self.index_documents_in_parallel(options["processes"], options["partition_size"], options["resume"])
         elif options["action"] == "index_all":
             self.index_documents(force_reindexing=True)
+        elif options["action"] == "reindex":
+            self.reindex_in_shadow_index(options["batch_size"])
         elif options["action"] == "index_flagged":
-            self.index_documents(force_reindexing=False)
+            self.index_flagged_documents()
+        elif options["action"] == "index_outbox":
+            self.index_outbox(options["batch_size"], options["loop"], options["interval"])
+        elif options["action"] == "outbox_status":
+            self.print_outbox_status()
         else:
             raise CommandError("unknown action {}".format(options["action"]))
 
@@ -72,3 +141,104 @@ class Command(BaseCommand):
                 print(f"  {indexed_counter}\titems indexed")
 
         self.index_manager.refresh_index()
+
+    def index_flagged_documents(self):
+        if self.index_manager.get_shadow_indices():
+            # the flagged documents are indexed in the shadow index, before it replaces the current one
+            print("- the index is being rebuilt, nothing to do")
+            return
+
+        self.index_documents(force_reindexing=False)
+
+    def reindex_in_shadow_index(self, batch_size):
+        """Index all the documents in a new index, while the current one is still searched, then replace it.
+
+        Meanwhile, ``index_flagged`` and ``index_outbox`` do nothing, so that the changes made during the
+        reindexation are applied to the new index before it replaces the current one.
+        """
+
+        shadow_manager = self.index_manager.create_shadow_index(self.models)
+        print(f"- indexing into {shadow_manager.index}")
+
+        for model in self.models:
+            if model is FakeChapter:
+                continue
+
+            print(f"- indexing {model.get_es_document_type()}s")
+            indexed_counter = shadow_manager.es_bulk_indexing_of_model(model, force_reindexing=True)
+            print(f"  {indexed_counter}\titems indexed")
+
+        print("- indexing the changes made meanwhile")
+        for model in self.models:
+            if model is not FakeChapter:
+                shadow_manager.es_bulk_indexing_of_model(model, force_reindexing=False)
+        while shadow_manager.process_outbox(batch_size):
+            pass
+
+        self.index_manager.switch_to_index(shadow_manager)
+        print(f"- {self.index_manager.index} now points to {shadow_manager.index}")
+
+    def get_progress_file_path(self):
+        return os.path.join(settings.BASE_DIR, f".{self.index_manager.index}_index_all_progress.json")
+
+    def get_partitions(self, partition_size):
+        partitions = []
+        for model in self.models:
+            if model is FakeChapter:
+                continue
+
+            bounds = model.get_es_django_indexable(force_reindexing=True).aggregate(first=Min("pk"), last=Max("pk"))
+            if bounds["first"] is None:
+                continue
+
+            for start in range(bounds["first"], bounds["last"] + 1, partition_size):
+                partitions.append((model._meta.label, start, min(start + partition_size, bounds["last"] + 1)))
+
+        return partitions
+
+    def index_documents_in_parallel(self, processes, partition_size, resume=False):
+        """Index all the documents, with the primary keys of each model split into partitions indexed by a pool of
+        ``processes`` workers. Completed partitions are saved in a progress file, so that an interrupted run can be
+        resumed with ``--resume``.
+        """
+
+        progress_file_path = self.get_progress_file_path()
+        completed = set()
+        if resume and os.path.exists(progress_file_path):
+            with open(progress_file_path) as progress_file:
+                completed = {tuple(partition) for partition in json.load(progress_file)}
+        else:
+            self.setup_es()  # remove all previous data
+
+        partitions = [partition for partition in self.get_partitions(partition_size) if partition not in completed]
+        total = len(partitions) + len(completed)
+        print(f"- indexing {len(partitions)} partitions ({len(completed)} already done) with {processes} processes")
+
+        # the workers must not share the connections of this process
+        connections.close_all()
+        with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+            for partition, indexed_counter in pool.imap_unordered(_index_partition, partitions):
+                completed.add(partition)
+                with open(progress_file_path, "w") as progress_file:
+                    json.dump(sorted(completed), progress_file)
+                model_label, start, stop = partition
+                print(f"  [{len(completed)}/{total}] {model_label} [{start}, {stop}): {indexed_counter}\titems indexed")
+
+        self.index_manager.refresh_index()
+        if os.path.exists(progress_file_path):
+            os.remove(progress_file_path)
+
+    def index_outbox(self, batch_size, loop=False, interval=2):
+        while True:
+            processed = self.index_manager.process_outbox(batch_size)
+            if processed:
+                self.index_manager.refresh_index()
+                self.print_outbox_status()
+            elif not loop:
+                break
+            else:
+                time.sleep(interval)
+
+    def print_outbox_status(self):
+        count, lag = ESIndexOutbox.get_lag()
+        print(f"{count} outbox entries, lag: {lag:.1f}s")
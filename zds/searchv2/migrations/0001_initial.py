@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-16 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="ESIndexOutbox",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("model_label", models.CharField(max_length=100, verbose_name="Modèle")),
+                ("object_pk", models.PositiveIntegerField(verbose_name="Identifiant de l'objet")),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[("index", "Indexer"), ("delete", "Supprimer")],
+                        default="index",
+                        max_length=10,
+                        verbose_name="Action",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Date de création")),
+            ],
+            options={
+                "verbose_name": "Document à indexer",
+                "verbose_name_plural": "Documents à indexer",
+            },
+        ),
+    ]
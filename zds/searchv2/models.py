@@ -1,19 +1,28 @@
+from contextlib import contextmanager
 from functools import partial
 import logging
+import math
+import re
+import threading
 import time
 
 from django.apps import apps
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
-from elasticsearch.helpers import parallel_bulk
-from elasticsearch import ConnectionError
+from elasticsearch.helpers import BulkIndexError, bulk
+from elasticsearch import ConnectionError, TransportError
 from elasticsearch_dsl import Mapping
+from elasticsearch_dsl import Q as ES_Q
 from elasticsearch_dsl.query import MatchAll
 from elasticsearch_dsl.connections import connections
 
 from django.db import transaction
 
+from zds.searchv2.bulk import BulkController
+from zds.searchv2.cache import invalidate_cached_results
+
 
 def es_document_mapper(force_reindexing, index, obj):
     action = "update" if obj.es_already_indexed and not force_reindexing else "index"
@@ -72,7 +81,7 @@ class AbstractESIndexable:
         return es_mapping
 
     @classmethod
-    def get_es_indexable(cls, force_reindexing=False):
+    def get_es_indexable(cls, force_reindexing=False, pks=None, flagged_only=True):
         """Return objects to index.
 
         .. attention::
@@ -80,6 +89,11 @@ class AbstractESIndexable:
 
         :param force_reindexing: force to return all objects, even if they may already be indexed.
         :type force_reindexing: bool
+        :param pks: if given, only return the objects with these primary keys.
+        :type pks: list|range
+        :param flagged_only: if ``False``, also return the objects which are not flagged for indexing, without
+            considering that the index is rebuilt (as ``force_reindexing`` does).
+        :type flagged_only: bool
         :rtype: list
         """
 
@@ -198,26 +212,99 @@ class AbstractESDjangoIndexable(AbstractESIndexable, models.Model):
         return query
 
     @classmethod
-    def get_es_indexable(cls, force_reindexing=False):
+    def get_es_children_document_types(cls):
+        """Method that can be overridden to give the types of the documents indexed with an object of this model as
+        parent (thus as routing), which must be deleted with it.
+
+        :rtype: list
+        """
+
+        return []
+
+    @classmethod
+    def get_es_indexable(cls, force_reindexing=False, pks=None, flagged_only=True):
         """Override ``get_es_indexable()`` in order to use the Django querysets and batch objects.
 
         :return: a queryset
         :rtype: django.db.models.query.QuerySet
         """
 
-        return cls.get_es_django_indexable(force_reindexing).order_by("pk").all()
+        query = cls.get_es_django_indexable(force_reindexing or not flagged_only)
+        if isinstance(pks, range):
+            query = query.filter(pk__gte=pks.start, pk__lt=pks.stop)
+        elif pks is not None:
+            query = query.filter(pk__in=pks)
+
+        return query.order_by("pk").all()
 
     def save(self, *args, **kwargs):
         """Override the ``save()`` method to flag the object if saved
         (which assumes a modification of the object, so the need to reindex).
 
+        If ``ZDS_APP["search"]["outbox_enabled"]`` is set, the object is also added to ``ESIndexOutbox``,
+        in the same transaction.
+
         .. note::
             Flagging can be prevented using ``save(es_flagged=False)``.
         """
 
         self.es_flagged = kwargs.pop("es_flagged", True)
 
-        return super().save(*args, **kwargs)
+        if not (self.es_flagged and ESIndexOutbox.is_enabled()):
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            result = super().save(*args, **kwargs)
+            ESIndexOutbox.enqueue(self)
+        return result
+
+
+class ESIndexOutbox(models.Model):
+    """Objects to (re)index or to delete from ES, written in the same transaction as their modification.
+
+    Entries are consumed by ``python manage.py es_manager index_outbox`` (see ``ESIndexManager.process_outbox()``)
+    and are only removed once the change reached ES, so each change is indexed at least once.
+    """
+
+    class Meta:
+        verbose_name = "Document à indexer"
+        verbose_name_plural = "Documents à indexer"
+
+    ACTIONS = (("index", "Indexer"), ("delete", "Supprimer"))
+
+    model_label = models.CharField("Modèle", max_length=100)
+    object_pk = models.PositiveIntegerField("Identifiant de l'objet")
+    action = models.CharField("Action", max_length=10, choices=ACTIONS, default="index")
+    created_at = models.DateTimeField("Date de création", auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.action} {self.model_label} {self.object_pk}"
+
+    @staticmethod
+    def is_enabled():
+        return settings.ES_ENABLED and settings.ZDS_APP["search"]["outbox_enabled"]
+
+    @classmethod
+    def enqueue(cls, instance, action="index"):
+        """Add an entry for ``instance``, which must be an ``AbstractESDjangoIndexable``.
+
+        :param action: either "index" or "delete"
+        :type action: str
+        """
+
+        return cls.objects.create(model_label=instance._meta.label, object_pk=instance.pk, action=action)
+
+    @classmethod
+    def get_lag(cls):
+        """Return the number of entries and the age (in seconds) of the oldest one, or 0 if there is no entry.
+
+        :rtype: tuple
+        """
+
+        oldest = cls.objects.order_by("pk").first()
+        if oldest is None:
+            return 0, 0
+        return cls.objects.count(), (timezone.now() - oldest.created_at).total_seconds()
 
 
 def delete_document_in_elasticsearch(instance):
@@ -228,11 +315,56 @@ def delete_document_in_elasticsearch(instance):
     :type instance: AbstractESIndexable
     """
 
-    index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+    if ESIndexOutbox.is_enabled():
+        ESIndexOutbox.enqueue(instance, action="delete")
+
+    index_manager = get_index_manager()
 
     if index_manager.index_exists:
         index_manager.delete_document(instance)
-        index_manager.refresh_index()
+        if not es_operations_are_buffered():  # otherwise, the index is refreshed once the operations are sent
+            index_manager.refresh_index()
+
+
+_buffers = threading.local()
+
+
+def es_operations_are_buffered():
+    """Tell whether the deletions and partial updates of documents are currently buffered by
+    ``buffered_es_operations()``.
+
+    :rtype: bool
+    """
+
+    return getattr(_buffers, "actions", None) is not None
+
+
+@contextmanager
+def buffered_es_operations():
+    """Buffer the deletions and partial updates of single documents (``ESIndexManager.delete_document()`` and
+    ``ESIndexManager.update_single_document()``, mostly called by model signals) made within this block, and send
+    them in a single bulk request when the current transaction is committed (or at the end of the block, if not in a
+    transaction). Nested blocks are merged into the outermost one.
+
+    Thus, deleting the 500 posts of a spammer makes one request to ES instead of 1000 sequential ones.
+    """
+
+    if es_operations_are_buffered():
+        yield
+        return
+
+    _buffers.actions = []
+    try:
+        yield
+    finally:
+        actions = _buffers.actions
+        _buffers.actions = None
+
+    managers = {}
+    for index_manager, action in actions:
+        managers.setdefault(id(index_manager), (index_manager, []))[1].append(action)
+    for index_manager, manager_actions in managers.values():
+        transaction.on_commit(partial(index_manager.send_buffered_actions, manager_actions))
 
 
 def get_django_indexable_objects():
@@ -240,17 +372,82 @@ def get_django_indexable_objects():
     return [model for model in apps.get_models() if issubclass(model, AbstractESDjangoIndexable)]
 
 
+def get_completion_inputs(title):
+    """Return the inputs of the completion field of a document, so that the completion starts at any of the first
+    words of ``title`` (up to ``ZDS_APP["search"]["autocompletion"]["max_inputs"]`` words).
+
+    :param title: the title of the document
+    :type title: str
+    :rtype: list
+    """
+
+    words = title.split()
+    max_inputs = settings.ZDS_APP["search"]["autocompletion"]["max_inputs"]
+    return [" ".join(words[i:]) for i in range(min(len(words), max_inputs))]
+
+
+def get_completion_weight(*boosts):
+    """Return the weight of the completion inputs of a document, so that the completions are ranked as the search
+    results: the product of the boosts (from ``ZDS_APP["search"]["boosts"]``) that apply to the document, scaled to
+    an integer, as ES requires.
+
+    :param boosts: the boosts that apply to the document
+    :type boosts: float
+    :rtype: int
+    """
+
+    return max(round(100 * math.prod(boosts)), 0)
+
+
 class NeedIndex(Exception):
     """Raised when an action requires an index, but it is not created (yet)."""
 
     pass
 
 
+class ESClusterState:
+    """Connectivity to the ES cluster and existence of an index, as last checked.
+
+    The state is shared by all the managers of a given index in the process (see ``get_cluster_state()``), so that
+    it is not checked again on every request.
+    """
+
+    def __init__(self):
+        self.connected_to_es = False
+        self.index_exists = False
+        self.checked_at = None
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+    def is_stale(self):
+        return (
+            self.checked_at is None
+            or time.monotonic() - self.checked_at > settings.ZDS_APP["search"]["cluster_state_ttl"]
+        )
+
+
+_cluster_states = {}
+_cluster_states_lock = threading.Lock()
+
+
+def get_cluster_state(connection_alias, index):
+    """Return the state of ``index`` shared by the process.
+
+    :rtype: ESClusterState
+    """
+
+    with _cluster_states_lock:
+        return _cluster_states.setdefault((connection_alias, index), ESClusterState())
+
+
 class ESIndexManager:
     """Manage a given index with different taylor-made functions"""
 
     def __init__(self, name, shards=5, replicas=0, connection_alias="default"):
-        """Create a manager for a given index
+        """Create a manager for a given index.
+
+        The connectivity to the cluster and the existence of the index are only checked if they were not checked
+        by another manager of this index in the last ``ZDS_APP["search"]["cluster_state_ttl"]`` seconds.
 
         :param name: the index name
         :type name: str
@@ -263,54 +460,117 @@ class ESIndexManager:
         """
 
         self.index = name
-        self.index_exists = False
 
         self.number_of_shards = shards
         self.number_of_replicas = replicas
+        self.connection_alias = connection_alias
 
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}:{self.index}")
 
         self.es = None
-        self.connected_to_es = False
+        self.state = ESClusterState()
 
         if settings.ES_ENABLED:
             self.es = connections.get_connection(alias=connection_alias)
-            self.connected_to_es = True
+            self.state = get_cluster_state(connection_alias, self.index)
+            self.refresh_cluster_state()
+
+    @property
+    def connected_to_es(self):
+        if self.es is not None and self.state.is_stale():
+            self.refresh_cluster_state()
+        return self.state.connected_to_es
+
+    @connected_to_es.setter
+    def connected_to_es(self, value):
+        self.state.connected_to_es = value
+
+    @property
+    def index_exists(self):
+        return self.state.index_exists
+
+    @index_exists.setter
+    def index_exists(self, value):
+        self.state.index_exists = value
+
+    def mark_disconnected(self):
+        """Record that the cluster could not be reached, so that the connectivity is checked again (synchronously)
+        the next time it is needed, instead of relying on the cached state until it expires.
+        """
+
+        self.state.connected_to_es = False
+        self.state.checked_at = None
+        self.logger.warn("lost connection to ES cluster")
+
+    def refresh_cluster_state(self, force=False):
+        """Check the connectivity to the cluster and the existence of the index, if the state is stale.
+
+        The first check is done synchronously, the following ones in background, while the last known state is used.
+
+        :param force: check synchronously, even if the state is fresh
+        :type force: bool
+        """
+
+        state = self.state
+        if force or state.checked_at is None:
+            self._check_cluster_state()
+            return
+
+        if not state.is_stale():
+            return
+
+        with state.lock:
+            if state.refreshing:
+                return
+            state.refreshing = True
+
+        threading.Thread(target=self._check_cluster_state, daemon=True).start()
 
-            # test connection:
+    def _check_cluster_state(self):
+        state = self.state
+        try:
             try:
                 self.es.info()
             except ConnectionError:
-                self.connected_to_es = False
+                state.connected_to_es = False
                 self.logger.warn("failed to connect to ES cluster")
             else:
+                state.connected_to_es = True
                 self.logger.info("connected to ES cluster")
 
-            if self.connected_to_es:
-                self.index_exists = self.es.indices.exists(self.index)
+            if state.connected_to_es:
+                state.index_exists = self.es.indices.exists(self.index)
+        finally:
+            state.checked_at = time.monotonic()
+            state.refreshing = False
 
     def clear_es_index(self):
-        """Clear index"""
+        """Clear index (or the indices behind it, if it is an alias)"""
 
         if not self.connected_to_es:
             return
 
-        if self.es.indices.exists(self.index):
+        if self.es.indices.exists_alias(name=self.index):
+            for index in self.es.indices.get_alias(name=self.index):
+                self.es.indices.delete(index)
+            self.logger.info("aliased indices cleared")
+
+            self.index_exists = False
+        elif self.es.indices.exists(self.index):
             self.es.indices.delete(self.index)
             self.logger.info("index cleared")
 
             self.index_exists = False
 
-    def reset_es_index(self, models):
+    def reset_es_index(self, models, bulk_load=False):
         """Delete old index and create an new one (with the same name). Setup the number of shards and replicas.
         Then, set mappings for the different models.
 
         :param models: list of models
         :type models: list
-        :param number_shards: number of shards
-        :type number_shards: int
-        :param number_replicas: number of replicas
-        :type number_replicas: int
+        :param bulk_load: create the index without replicas nor periodic refresh, to fill it as fast as possible
+            (see ``end_bulk_load()``)
+        :type bulk_load: bool
         """
 
         if not self.connected_to_es:
@@ -324,18 +584,107 @@ class ESIndexManager:
             mapping = model.get_es_mapping()
             mappings_def.update(mapping.to_dict())
 
-        self.es.indices.create(
-            self.index,
-            body={
-                "settings": {"number_of_shards": self.number_of_shards, "number_of_replicas": self.number_of_replicas},
-                "mappings": mappings_def,
-            },
-        )
+        index_settings = {"number_of_shards": self.number_of_shards, "number_of_replicas": self.number_of_replicas}
+        if bulk_load:
+            index_settings.update({"number_of_replicas": 0, "refresh_interval": "-1"})
+
+        self.es.indices.create(self.index, body={"settings": index_settings, "mappings": mappings_def})
 
         self.index_exists = True
 
         self.logger.info("index created")
 
+    def end_bulk_load(self):
+        """Restore the replicas and the periodic refresh of an index created with ``reset_es_index(bulk_load=True)``."""
+
+        if not self.connected_to_es:
+            return
+
+        if not self.index_exists:
+            raise NeedIndex()
+
+        self.es.indices.put_settings(
+            index=self.index,
+            body={"index": {"number_of_replicas": self.number_of_replicas, "refresh_interval": "1s"}},
+        )
+        self.refresh_index()
+
+    def get_shadow_indices(self):
+        """Return the indices created by ``create_shadow_index()`` which do not replace this one yet.
+
+        While there is such an index, the outbox is not applied to this index anymore (see ``process_outbox()``),
+        so that the changes are applied to the new one before it replaces this one.
+
+        :rtype: list
+        """
+
+        if not self.connected_to_es:
+            return []
+
+        pattern = re.compile(rf"^{re.escape(self.index)}_\d{{14}}$")
+        indices = self.es.indices.get_settings(index=f"{self.index}_*", ignore=404)
+        aliased = self.es.indices.get_alias(name=self.index) if self.es.indices.exists_alias(name=self.index) else {}
+        return sorted(index for index in indices if pattern.match(index) and index not in aliased)
+
+    def create_shadow_index(self, models):
+        """Create a new index, named after this one and the current date, to be filled while this one is still
+        searched. Once filled, it replaces this one with ``switch_to_index()``.
+
+        The shadow indices left by an interrupted reindexation are deleted first.
+
+        :param models: list of models
+        :type models: list
+        :return: the manager of the new index
+        :rtype: ESIndexManager
+        """
+
+        for index in self.get_shadow_indices():
+            self.logger.warn(f"delete the shadow index {index}, left by an interrupted reindexation")
+            self.es.indices.delete(index)
+
+        shadow_manager = ESIndexManager(
+            "{}_{}".format(self.index, time.strftime("%Y%m%d%H%M%S")),
+            shards=self.number_of_shards,
+            replicas=self.number_of_replicas,
+            connection_alias=self.connection_alias,
+        )
+        shadow_manager.reset_es_index(models, bulk_load=True)
+        shadow_manager.setup_custom_analyzer()
+
+        return shadow_manager
+
+    def switch_to_index(self, shadow_manager):
+        """Make the name of this index an alias of the index of ``shadow_manager``, in a single operation,
+        then delete the indices previously behind this name.
+
+        .. note::
+            If this index is not an alias yet, it has to be deleted before the alias is created.
+
+        :param shadow_manager: the manager of the new index, as returned by ``create_shadow_index()``
+        :type shadow_manager: ESIndexManager
+        """
+
+        if not self.connected_to_es:
+            return
+
+        shadow_manager.end_bulk_load()
+
+        actions = [{"add": {"index": shadow_manager.index, "alias": self.index}}]
+        old_indices = []
+        if self.es.indices.exists_alias(name=self.index):
+            old_indices = list(self.es.indices.get_alias(name=self.index))
+            actions = [{"remove": {"index": index, "alias": self.index}} for index in old_indices] + actions
+        elif self.es.indices.exists(self.index):
+            self.es.indices.delete(self.index)
+
+        self.es.indices.update_aliases(body={"actions": actions})
+        self.index_exists = True
+        self.logger.info(f"alias now pointing to {shadow_manager.index}")
+        invalidate_cached_results(self.index)
+
+        for index in old_indices:
+            self.es.indices.delete(index)
+
     def setup_custom_analyzer(self):
         """Override the default analyzer.
 
@@ -442,11 +791,12 @@ class ESIndexManager:
 
         self.logger.info(f"unindex {model.get_es_document_type()}")
 
-    def es_bulk_indexing_of_model(self, model, force_reindexing=False):
+    def es_bulk_indexing_of_model(self, model, force_reindexing=False, pks=None):
         """Perform a bulk action on documents of a given model. Use the ``objects_per_batch`` property to index.
 
-        See http://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.bulk
-        and http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.parallel_bulk
+        See http://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.bulk.
+        The size of the bulk requests is adapted to the load of the cluster by a ``BulkController``. Objects whose
+        document could not be indexed remain flagged.
 
         .. attention::
             + Currently only implemented with "index" and "update" !
@@ -456,6 +806,8 @@ class ESIndexManager:
         :type model: class
         :param force_reindexing: force all document to be returned
         :type force_reindexing: bool
+        :param pks: if given, only index the objects with these primary keys
+        :type pks: list|range
         :return: the number of documents indexed
         :rtype: int
         """
@@ -471,11 +823,27 @@ class ESIndexManager:
             self.logger.warn("Cannot index FakeChapter model. Please index its parent model.")
             return 0
 
+        indexed_counter, _ = self._bulk_index(model, force_reindexing, pks)
+        return indexed_counter
+
+    def _bulk_index(self, model, force_reindexing=False, pks=None, flagged_only=True):
+        """Index the documents of ``model``, as described in ``es_bulk_indexing_of_model()``.
+
+        :param flagged_only: if ``False``, also index the objects which are not flagged
+        :type flagged_only: bool
+
+        :return: the number of documents indexed and the primary keys of the objects whose document (or the document
+            of one of their chapters) could not be indexed
+        :rtype: tuple
+        """
+
         documents_formatter = partial(es_document_mapper, force_reindexing, self.index)
-        objects_per_batch = getattr(model, "objects_per_batch", 100)
+        controller = BulkController(self.es)
+        controller.batch_size = getattr(model, "objects_per_batch", controller.batch_size)
         indexed_counter = 0
+        failed_pks = set()
         if model.__name__ == "PublishedContent":
-            generate = model.get_es_indexable(force_reindexing)
+            generate = model.get_es_indexable(force_reindexing, pks=pks, flagged_only=flagged_only)
             while True:
                 with transaction.atomic():
                     try:
@@ -485,83 +853,124 @@ class ESIndexManager:
                         break
                     if not objects:
                         break
+
+                    failed = controller.send(list(map(documents_formatter, objects)))
+                    indexed = [o for o in objects if o.es_id not in failed]
+
+                    # mark all these objects as indexed at once
                     if hasattr(objects[0], "parent_model"):
                         model_to_update = objects[0].parent_model
-                        pks = [o.parent_id for o in objects]
+                        indexed_pks = [o.parent_id for o in indexed]
+                        failed_pks.update(o.parent_id for o in objects if o.es_id in failed)
                     else:
                         model_to_update = model
-                        pks = [o.pk for o in objects]
-
-                    formatted_documents = list(map(documents_formatter, objects))
-
-                    for _, hit in parallel_bulk(
-                        self.es, formatted_documents, chunk_size=objects_per_batch, request_timeout=30
-                    ):
-                        action = list(hit.keys())[0]
-                        self.logger.info("{} {} with id {}".format(action, hit[action]["_type"], hit[action]["_id"]))
-
-                    # mark all these objects as indexed at once
-                    model_to_update.objects.filter(pk__in=pks).update(es_already_indexed=True, es_flagged=False)
-                    indexed_counter += len(objects)
-            return indexed_counter
+                        indexed_pks = [o.pk for o in indexed]
+                        failed_pks.update(o.pk for o in objects if o.es_id in failed)
+                    model_to_update.objects.filter(pk__in=indexed_pks).update(es_already_indexed=True, es_flagged=False)
+                    indexed_counter += len(indexed)
         else:
-            then = time.time()
-            prev_obj_per_sec = False
             last_pk = 0
-            object_source = model.get_es_indexable(force_reindexing)
+            object_source = model.get_es_indexable(force_reindexing, pks=pks, flagged_only=flagged_only)
 
             while True:
                 with transaction.atomic():
-                    # fetch a batch
-                    objects = list(object_source.filter(pk__gt=last_pk)[:objects_per_batch])
+                    # fetch a batch, as big as what the cluster currently accepts in a bulk request
+                    objects = list(object_source.filter(pk__gt=last_pk)[: controller.batch_size])
                     if not objects:
                         break
 
-                    formatted_documents = list(map(documents_formatter, objects))
-
-                    for _, hit in parallel_bulk(
-                        self.es, formatted_documents, chunk_size=objects_per_batch, request_timeout=30
-                    ):
-                        if self.logger.getEffectiveLevel() <= logging.INFO:
-                            action = list(hit.keys())[0]
-                            self.logger.info(
-                                "{} {} with id {}".format(action, hit[action]["_type"], hit[action]["_id"])
-                            )
+                    failed = controller.send(list(map(documents_formatter, objects)))
 
                     # mark all these objects as indexed at once
-                    model.objects.filter(pk__in=[o.pk for o in objects]).update(
-                        es_already_indexed=True, es_flagged=False
-                    )
-                    indexed_counter += len(objects)
-
-                    # basic estimation of indexed objects per second
-                    now = time.time()
-                    last_batch_duration = int(now - then) or 1
-                    then = now
-                    obj_per_sec = round(float(objects_per_batch) / last_batch_duration, 2)
+                    indexed_pks = [o.pk for o in objects if o.es_id not in failed]
+                    model.objects.filter(pk__in=indexed_pks).update(es_already_indexed=True, es_flagged=False)
+                    indexed_counter += len(indexed_pks)
+                    failed_pks.update(o.pk for o in objects if o.es_id in failed)
+
                     if force_reindexing:
+                        obj_per_sec, mean_latency = controller.get_throughput()
                         print(
-                            "    {} so far ({} obj/s, batch size: {})".format(
-                                indexed_counter, obj_per_sec, objects_per_batch
+                            "    {} so far ({:.2f} obj/s, {:.2f}s per request, batch size: {})".format(
+                                indexed_counter, obj_per_sec, mean_latency, controller.batch_size
                             )
                         )
 
-                    if prev_obj_per_sec is False:
-                        prev_obj_per_sec = obj_per_sec
-                    else:
-                        ratio = obj_per_sec / prev_obj_per_sec
-                        # if we processed this batch 10% slower/faster than the previous one,
-                        # shrink/increase batch size
-                        if abs(1 - ratio) > 0.1:
-                            objects_per_batch = int(objects_per_batch * ratio)
-                            if force_reindexing:
-                                print(f"     {round(ratio, 2)}x, new batch size: {objects_per_batch}")
-                        prev_obj_per_sec = obj_per_sec
-
                     # fetch next batch
                     last_pk = objects[-1].pk
 
-            return indexed_counter
+        obj_per_sec, mean_latency = controller.get_throughput()
+        self.logger.info(
+            f"{indexed_counter} {model.get_es_document_type()} indexed ({obj_per_sec:.2f} obj/s, "
+            f"{controller.stats['rejected']} rejections, {controller.stats['failed']} failures)"
+        )
+        return indexed_counter, failed_pks
+
+    def process_outbox(self, batch_size=500):
+        """Apply the oldest entries of ``ESIndexOutbox`` to the index, then remove them.
+
+        Objects to index are indexed with ``es_bulk_indexing_of_model()``, even if they are not flagged anymore (they
+        may have been saved again while a previous batch was indexed, after being read), then deleted objects are
+        removed from the index. The entries of the objects whose document could not be indexed are kept to be
+        processed again, as well as all the entries if anything else fails.
+
+        Nothing is processed while this index is rebuilt in a shadow index (see ``get_shadow_indices()``): the entries
+        are then processed by the manager of the shadow index, before it replaces this one.
+
+        :param batch_size: maximum number of entries to process
+        :type batch_size: int
+        :return: the number of processed entries
+        :rtype: int
+        """
+
+        if not self.connected_to_es:
+            return 0
+
+        if not self.index_exists:
+            raise NeedIndex()
+
+        if self.get_shadow_indices():
+            self.logger.info("outbox held during the reindexation")
+            return 0
+
+        entries = list(ESIndexOutbox.objects.order_by("pk")[:batch_size])
+        if not entries:
+            return 0
+
+        to_index = {}
+        to_delete = {}
+        for entry in entries:
+            actions = to_index if entry.action == "index" else to_delete
+            actions.setdefault(entry.model_label, set()).add(entry.object_pk)
+
+        failed_entries = set()
+        for model_label, pks in to_index.items():
+            _, failed_pks = self._bulk_index(apps.get_model(model_label), pks=sorted(pks), flagged_only=False)
+            failed_entries.update((model_label, pk) for pk in failed_pks)
+
+        for model_label, pks in to_delete.items():
+            model = apps.get_model(model_label)
+            es_ids = [str(pk) for pk in sorted(pks)]
+            for document_type in model.get_es_children_document_types():
+                self.delete_by_query(document_type, ES_Q("terms", _routing=es_ids))
+
+            documents = [
+                {"_op_type": "delete", "_index": self.index, "_type": model.get_es_document_type(), "_id": es_id}
+                for es_id in es_ids
+            ]
+            _, errors = bulk(self.es, documents, raise_on_error=False)
+            errors = [error for error in errors if error["delete"]["status"] != 404]  # already deleted
+            if errors:
+                raise BulkIndexError(f"{len(errors)} document(s) failed to be deleted.", errors)
+
+        processed = [
+            entry
+            for entry in entries
+            if entry.action != "index" or (entry.model_label, entry.object_pk) not in failed_entries
+        ]
+        ESIndexOutbox.objects.filter(pk__in=[entry.pk for entry in processed]).delete()
+        self.logger.info(f"processed {len(processed)} outbox entries ({len(entries) - len(processed)} failed)")
+
+        return len(processed)
 
     def refresh_index(self):
         """Force the refreshing the index. The task is normally done periodically, but may be forced with this method.
@@ -570,7 +979,8 @@ class ESIndexManager:
 
         .. note::
 
-            The use of this function is mandatory if you want to use the search right after an indexing.
+            The use of this function is mandatory if you want to use the search right after an indexing. It also
+            invalidates the cached results of the searches (see ``zds.searchv2.cache.CachedSearch``).
         """
 
         if not self.connected_to_es:
@@ -580,6 +990,7 @@ class ESIndexManager:
             raise NeedIndex()
 
         self.es.indices.refresh(self.index)
+        invalidate_cached_results(self.index)
 
     def update_single_document(self, document, doc):
         """Update given fields of a single document.
@@ -598,9 +1009,16 @@ class ESIndexManager:
         if not self.index_exists:
             raise NeedIndex()
 
+        if self._buffer_action(document, "update", doc=doc):
+            return
+
         arguments = {"index": self.index, "doc_type": document.get_es_document_type(), "id": document.es_id}
-        if self.es.exists(**arguments):
-            self.es.update(body={"doc": doc}, **arguments)
+        try:
+            response = self.es.update(body={"doc": doc}, ignore=404, **arguments)  # the document may not be indexed yet
+        except ConnectionError:
+            self.mark_disconnected()
+            return
+        if "result" in response:
             self.logger.info(f"partial_update {document.get_es_document_type()} with id {document.es_id}")
 
     def delete_document(self, document):
@@ -616,11 +1034,57 @@ class ESIndexManager:
         if not self.index_exists:
             raise NeedIndex()
 
+        if self._buffer_action(document, "delete"):
+            return
+
         arguments = {"index": self.index, "doc_type": document.get_es_document_type(), "id": document.es_id}
-        if self.es.exists(**arguments):
-            self.es.delete(**arguments)
+        try:
+            response = self.es.delete(ignore=404, **arguments)  # the document may not be indexed
+        except ConnectionError:
+            self.mark_disconnected()
+            return
+        if response.get("result") == "deleted":
             self.logger.info(f"delete {document.get_es_document_type()} with id {document.es_id}")
 
+    def _buffer_action(self, document, op_type, **kwargs):
+        """Add an action on ``document`` to the ones buffered by ``buffered_es_operations()``, if any.
+
+        :return: whether the action was buffered
+        :rtype: bool
+        """
+
+        if not es_operations_are_buffered():
+            return False
+
+        action = {"_op_type": op_type, "_type": document.get_es_document_type(), "_id": document.es_id, **kwargs}
+        _buffers.actions.append((self, action))
+        return True
+
+    def send_buffered_actions(self, actions):
+        """Send the actions buffered by ``buffered_es_operations()`` in a single bulk request, then refresh the index.
+        Documents which are not indexed are ignored.
+
+        :param actions: the actions, in the format of ``elasticsearch.helpers.bulk()``
+        :type actions: list
+        """
+
+        if not self.connected_to_es or not self.index_exists:
+            return
+
+        try:
+            _, errors = bulk(self.es, actions, index=self.index, raise_on_error=False)
+        except ConnectionError:
+            self.mark_disconnected()
+            return
+
+        for error in errors:
+            op_type, result = next(iter(error.items()))
+            if result["status"] != 404:  # not indexed (yet)
+                self.logger.error(f"unable to {op_type} document {result['_id']}: {result.get('error')}")
+
+        self.logger.info(f"sent {len(actions)} buffered actions ({len(errors)} ignored or failed)")
+        self.refresh_index()
+
     def delete_by_query(self, doc_type="", query=MatchAll()):
         """Perform a deletion trough the ``_delete_by_query`` API.
 
@@ -645,6 +1109,51 @@ class ESIndexManager:
 
         self.logger.info("delete_by_query {}s ({})".format(doc_type, response["deleted"]))
 
+    def suggest(self, field, prefix, size=10, contexts=None, source=None):
+        """Find the documents for which ``field`` (of the ``completion`` type) starts with ``prefix``, through the
+        completion suggester. It is way faster than a full-text query, as it only looks into an in-memory structure.
+
+        See https://www.elastic.co/guide/en/elasticsearch/reference/5.5/search-suggesters-completion.html.
+
+        :param field: the completion field
+        :type field: str
+        :param prefix: the beginning of the text, as typed by the user
+        :type prefix: str
+        :param size: the maximum number of documents
+        :type size: int
+        :param contexts: restrict the documents to these contexts (e.g. ``{"forum_pk": ["1", "2"]}``)
+        :type contexts: dict
+        :param source: the fields of the documents to return (all if ``None``)
+        :type source: list
+        :return: the ``_source`` of the documents, best first
+        :rtype: list
+        """
+
+        if not self.connected_to_es or not self.index_exists:
+            return []
+
+        completion = {"field": field, "size": size}
+        if contexts:
+            completion["contexts"] = contexts
+        body = {"size": 0, "suggest": {"completion": {"prefix": prefix, "completion": completion}}}
+        if source is not None:
+            body["_source"] = source
+
+        try:
+            response = self.es.search(index=self.index, body=body)
+        except ConnectionError:
+            self.mark_disconnected()
+            return []
+        except TransportError:
+            # e.g. the index was created before the completion field was added to the mapping
+            self.logger.warning(f"unable to get the completions of {field}", exc_info=True)
+            return []
+
+        documents = []
+        for suggestion in response["suggest"]["completion"]:
+            documents.extend(option["_source"] for option in suggestion["options"])
+        return documents
+
     def analyze_sentence(self, request):
         """Use the anlyzer on a given sentence. Get back the list of tokens.
 
@@ -687,3 +1196,20 @@ class ESIndexManager:
             raise NeedIndex()
 
         return request.index(self.index).using(self.es)
+
+
+_index_managers = {}
+_index_managers_lock = threading.Lock()
+
+
+def get_index_manager():
+    """Return the manager of the search index (defined by ``ES_SEARCH_INDEX``) shared by the process.
+
+    :rtype: ESIndexManager
+    """
+
+    key = (settings.ES_ENABLED, tuple(sorted(settings.ES_SEARCH_INDEX.items())))
+    with _index_managers_lock:
+        if key not in _index_managers:
+            _index_managers[key] = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        return _index_managers[key]
@@ -0,0 +1,57 @@
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+
+from zds.searchv2.bulk import BulkController
+
+
+def make_document(es_id):
+    return {"_op_type": "index", "_index": "zds_search_test", "_type": "topic", "_id": es_id, "_source": {"pk": es_id}}
+
+
+def make_item(document_id, status):
+    return {"index": {"_type": "topic", "_id": document_id, "status": status}}
+
+
+@mock.patch("zds.searchv2.bulk.time.sleep")
+class BulkControllerTests(TestCase):
+    def setUp(self):
+        self.es = mock.Mock()
+        self.es.transport.serializer.dumps = json.dumps
+        self.config = settings.ZDS_APP["search"]["bulk"]
+
+    def test_additive_increase(self, mock_sleep):
+        self.es.bulk.side_effect = lambda body, **kwargs: {
+            "items": [make_item(json.loads(line)["index"]["_id"], 201) for line in body.splitlines()[::2]]
+        }
+        controller = BulkController(self.es)
+        controller.batch_size = 2
+
+        failed = controller.send([make_document(str(pk)) for pk in range(5)])
+
+        self.assertEqual(failed, set())
+        self.assertEqual(controller.stats["documents"], 5)
+        # the second request may contain more documents than the first one
+        self.assertEqual(self.es.bulk.call_count, 2)
+        self.assertEqual(controller.batch_size, 2 + 2 * self.config["additive_step"])
+
+    def test_rejected_documents_are_retried(self, mock_sleep):
+        self.es.bulk.side_effect = [
+            {"items": [make_item("1", 201), make_item("2", 429), make_item("3", 400)]},
+            {"items": [make_item("2", 201)]},
+        ]
+        controller = BulkController(self.es)
+        batch_size = controller.batch_size
+
+        failed = controller.send([make_document(str(pk)) for pk in range(1, 4)])
+
+        self.assertEqual(failed, {"3"})
+        self.assertEqual(controller.stats["rejected"], 1)
+        self.assertEqual(controller.stats["documents"], 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertIn('"_id": "2"', self.es.bulk.call_args[1]["body"])
+        # multiplicative decrease, then additive increase
+        expected = max(int(batch_size * self.config["decrease_factor"]), self.config["min_batch_size"])
+        self.assertEqual(controller.batch_size, expected + self.config["additive_step"])
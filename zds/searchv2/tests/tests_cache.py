@@ -0,0 +1,97 @@
+from copy import deepcopy
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+
+from zds.searchv2.cache import CachedSearch, invalidate_cached_results
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def make_search(executed):
+    """Mock a search, appending the bounds of the executed slices to ``executed``."""
+
+    search = mock.MagicMock()
+    search._extra = {}
+    search.count.return_value = 42
+
+    def get_slice(k):
+        sliced = mock.MagicMock()
+        sliced._extra = {"from": k.start, "size": k.stop - k.start}
+
+        def execute():
+            executed.append((k.start, k.stop))
+            response = mock.MagicMock()
+            response.to_dict.return_value = {"hits": {"total": 42, "hits": []}}
+            response.hits.total = 42
+            return response
+
+        sliced.execute.side_effect = execute
+        return sliced
+
+    search.__getitem__.side_effect = get_slice
+    return search
+
+
+class CachedSearchTests(TestCase):
+    def setUp(self):
+        app = deepcopy(settings.ZDS_APP)
+        app["search"]["results_cache"]["enabled"] = True
+        self.overridden_settings = self.settings(ZDS_APP=app, CACHES=LOCMEM_CACHES)
+        self.overridden_settings.enable()
+
+    def tearDown(self):
+        self.overridden_settings.disable()
+
+    def test_pages_are_cached(self):
+        executed = []
+        search = make_search(executed)
+        first = CachedSearch(search, "zds_search_test", ["test", ["topic"], [1, 2]])
+        first[0:20].execute()
+        self.assertEqual(first.count(), 42)
+        self.assertEqual(search.count.call_count, 0)  # the total came with the page
+        self.assertEqual(executed, [(0, 20)])
+
+        # same search, for another request: no query to ES
+        second = CachedSearch(make_search(executed), "zds_search_test", ["test", ["topic"], [1, 2]])
+        self.assertEqual(second[0:20].execute().hits.total, 42)
+        self.assertEqual(second.count(), 42)
+        self.assertEqual(executed, [(0, 20)])
+
+        # another page, or another set of visible forums, is not in the cache
+        second[20:40].execute()
+        CachedSearch(make_search(executed), "zds_search_test", ["test", ["topic"], [1]])[0:20].execute()
+        self.assertEqual(executed, [(0, 20), (20, 40), (0, 20)])
+
+    def test_count_with_the_page(self):
+        executed = []
+        search = make_search(executed)
+        cached = CachedSearch(search, "zds_search_test", ["test"], count_slice=slice(40, 60))
+        self.assertEqual(cached.count(), 42)
+
+        # the last page, cut to the count by the paginator, is the one already received
+        self.assertEqual(cached[40:42].execute().hits.total, 42)
+        self.assertEqual(executed, [(40, 60)])
+        self.assertEqual(search.count.call_count, 0)
+
+    def test_refresh_invalidates(self):
+        executed = []
+        key_parts = ["test", ["topic"], [1, 2]]
+        CachedSearch(make_search(executed), "zds_search_test", key_parts)[0:20].execute()
+        CachedSearch(make_search(executed), "zds_search_test", key_parts)[0:20].execute()
+        self.assertEqual(len(executed), 1)
+
+        invalidate_cached_results("zds_search_test")
+        CachedSearch(make_search(executed), "zds_search_test", key_parts)[0:20].execute()
+        self.assertEqual(len(executed), 2)
+
+    def test_disabled(self):
+        settings.ZDS_APP["search"]["results_cache"]["enabled"] = False
+        executed = []
+        for _ in range(2):
+            cached = CachedSearch(make_search(executed), "zds_search_test", ["test"])
+            cached[0:20].execute()
+            self.assertEqual(cached.count(), 42)
+            self.assertEqual(cached.search.count.call_count, 1)
+        self.assertEqual(len(executed), 2)
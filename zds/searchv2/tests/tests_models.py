@@ -1,13 +1,17 @@
+from copy import deepcopy
+from unittest import mock
+
+from elasticsearch import ConnectionError
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import MatchAll
 
 from django.conf import settings
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from zds.forum.tests.factories import TopicFactory, PostFactory, Topic, Post
 from zds.forum.tests.factories import create_category_and_forum
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.models import ESIndexManager, ESIndexOutbox, buffered_es_operations, get_index_manager
 from zds.tutorialv2.tests.factories import PublishableContentFactory, ContainerFactory, ExtractFactory, publish_content
 from zds.tutorialv2.models.database import PublishedContent, FakeChapter, PublishableContent
 from zds.tutorialv2.tests import TutorialTestMixin, override_for_contents
@@ -359,8 +363,281 @@ class ESIndexManagerTests(TutorialTestMixin, TestCase):
         self.assertTrue(found_new)
         self.assertFalse(found_old)
 
+    def test_indexable_partitions(self):
+        """Test the restriction of ``get_es_indexable()`` to some primary keys"""
+
+        topics = [TopicFactory(forum=self.forum, author=self.user) for _ in range(3)]
+        first, last = topics[0].pk, topics[-1].pk
+
+        indexable = Topic.get_es_indexable(force_reindexing=True, pks=range(first, last))
+        self.assertEqual([topic.pk for topic in indexable], [topic.pk for topic in topics[:-1]])
+
+        indexable = Topic.get_es_indexable(force_reindexing=True, pks=[last])
+        self.assertEqual([topic.pk for topic in indexable], [last])
+
+    def test_public_version_loaded_once(self):
+        """Test that chapters and documents of a content are built from the same loaded version"""
+
+        tuto = PublishableContentFactory(type="TUTORIAL")
+        tuto.authors.add(self.user)
+        tuto.save()
+
+        tuto_draft = tuto.load_version()
+        chapter1 = ContainerFactory(parent=tuto_draft, db_object=tuto)
+        ExtractFactory(container=chapter1, db_object=tuto)
+        published = publish_content(tuto, tuto_draft, is_major_update=True)
+
+        tuto.sha_public = tuto_draft.current_version
+        tuto.sha_draft = tuto_draft.current_version
+        tuto.public_version = published
+        tuto.save()
+
+        load_version = PublishableContent.load_version
+        with mock.patch.object(PublishableContent, "load_version", autospec=True, side_effect=load_version) as load:
+            for objects in PublishedContent.get_es_indexable(force_reindexing=True):
+                for obj in objects:
+                    obj.get_es_document_source()
+
+        self.assertEqual(load.call_count, 1)
+
+    def test_shadow_index(self):
+        """Test the reindexation into a new index, then the switch to it"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        topic = TopicFactory(forum=self.forum, author=self.user)
+
+        shadow_manager = self.manager.create_shadow_index(self.indexable)
+        self.assertNotEqual(shadow_manager.index, self.manager.index)
+        index_settings = self.manager.es.indices.get_settings(index=shadow_manager.index)
+        self.assertEqual(index_settings[shadow_manager.index]["settings"]["index"]["refresh_interval"], "-1")
+
+        shadow_manager.es_bulk_indexing_of_model(Topic, force_reindexing=True)
+
+        # the current index is still the one searched
+        results = self.manager.setup_search(Search().query(MatchAll())).execute()
+        self.assertEqual(len(results), 0)
+
+        self.manager.switch_to_index(shadow_manager)
+        self.assertEqual(list(self.manager.es.indices.get_alias(name=self.manager.index)), [shadow_manager.index])
+
+        results = self.manager.setup_search(Search().query(MatchAll())).execute()
+        self.assertEqual([hit.meta.id for hit in results], [str(topic.pk)])
+
+    def test_outbox_during_reindexation(self):
+        """Test that the changes made while the index is rebuilt are applied to the new index"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        with self.settings(ZDS_APP=deepcopy(settings.ZDS_APP)):
+            settings.ZDS_APP["search"]["outbox_enabled"] = True
+
+            topic = TopicFactory(forum=self.forum, author=self.user)
+            self.manager.process_outbox()
+
+            shadow_manager = self.manager.create_shadow_index(self.indexable)
+            self.assertEqual(self.manager.get_shadow_indices(), [shadow_manager.index])
+            shadow_manager.es_bulk_indexing_of_model(Topic, force_reindexing=True)
+
+            # a post is written meanwhile: it is kept in the outbox, not indexed in the current index
+            post = PostFactory(topic=topic, author=self.user, position=1)
+            self.assertEqual(self.manager.process_outbox(), 0)
+            self.assertEqual(ESIndexOutbox.objects.count(), 1)
+
+            self.assertEqual(shadow_manager.process_outbox(), 1)
+            self.manager.switch_to_index(shadow_manager)
+            self.assertEqual(self.manager.get_shadow_indices(), [])
+
+            self.manager.refresh_index()
+            results = self.manager.setup_search(Search().query(MatchAll())).execute()
+            self.assertEqual({hit.meta.id for hit in results if hit.meta.doc_type == "post"}, {str(post.pk)})
+
+    def test_outbox(self):
+        """Test that changes recorded in the outbox reach the index"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        with self.settings(ZDS_APP=deepcopy(settings.ZDS_APP)):
+            settings.ZDS_APP["search"]["outbox_enabled"] = True
+
+            topic = TopicFactory(forum=self.forum, author=self.user)
+            post = PostFactory(topic=topic, author=self.user, position=1)
+            self.assertEqual(ESIndexOutbox.objects.filter(action="index").count(), 2)
+
+            self.assertEqual(self.manager.process_outbox(), 2)
+            self.manager.refresh_index()
+            self.assertEqual(ESIndexOutbox.objects.count(), 0)
+            self.assertEqual(ESIndexOutbox.get_lag(), (0, 0))
+
+            results = self.manager.setup_search(Search().query(MatchAll())).execute()
+            self.assertEqual({hit.meta.doc_type for hit in results}, {"topic", "post"})
+            self.assertTrue(Post.objects.get(pk=post.pk).es_already_indexed)
+
+            post.delete()
+            self.assertEqual(ESIndexOutbox.objects.filter(action="delete").count(), 1)
+            self.assertEqual(self.manager.process_outbox(), 1)
+            self.manager.refresh_index()
+
+            results = self.manager.setup_search(Search().query(MatchAll())).execute()
+            self.assertEqual([hit.meta.doc_type for hit in results], ["topic"])
+
+    def test_outbox_keeps_failed_entries(self):
+        """Test that the outbox entries of the documents which could not be indexed are kept"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        with self.settings(ZDS_APP=deepcopy(settings.ZDS_APP)):
+            settings.ZDS_APP["search"]["outbox_enabled"] = True
+            settings.ZDS_APP["search"]["bulk"]["max_retries"] = 0
+
+            topic = TopicFactory(forum=self.forum, author=self.user)
+            post = PostFactory(topic=topic, author=self.user, position=1)
+            failing_post = PostFactory(topic=topic, author=self.user, position=2)
+
+            es_bulk = self.manager.es.bulk
+
+            def bulk(*args, **kwargs):
+                response = es_bulk(*args, **kwargs)
+                for item in response["items"]:
+                    result = next(iter(item.values()))
+                    if result["_type"] == "post" and result["_id"] == str(failing_post.pk):
+                        result["status"] = 400
+                return response
+
+            with mock.patch.object(self.manager.es, "bulk", side_effect=bulk):
+                self.assertEqual(self.manager.process_outbox(), 2)
+
+            self.assertEqual(
+                list(ESIndexOutbox.objects.values_list("model_label", "object_pk")), [("forum.Post", failing_post.pk)]
+            )
+            self.assertTrue(Post.objects.get(pk=post.pk).es_already_indexed)
+            self.assertTrue(Post.objects.get(pk=failing_post.pk).es_flagged)
+
+            self.assertEqual(self.manager.process_outbox(), 1)
+            self.assertEqual(ESIndexOutbox.objects.count(), 0)
+
+    def test_outbox_save_during_batch(self):
+        """Test that an object saved while its outbox entry is processed is indexed again with the next batch"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        with self.settings(ZDS_APP=deepcopy(settings.ZDS_APP)):
+            settings.ZDS_APP["search"]["outbox_enabled"] = True
+
+            topic = TopicFactory(forum=self.forum, author=self.user)
+            post = PostFactory(topic=topic, author=self.user, position=1)
+            self.manager.process_outbox()
+
+            post.is_useful = True
+            post.save()
+
+            es_bulk = self.manager.es.bulk
+
+            def bulk(*args, **kwargs):
+                # the post was read, and is saved again before the end of the batch
+                Post.objects.get(pk=post.pk).save()
+                return es_bulk(*args, **kwargs)
+
+            with mock.patch.object(self.manager.es, "bulk", side_effect=bulk):
+                self.assertEqual(self.manager.process_outbox(), 1)
+
+            # the flag was cleared by the batch, but the entry of the last save remains
+            self.assertFalse(Post.objects.get(pk=post.pk).es_flagged)
+            self.assertEqual(list(ESIndexOutbox.objects.values_list("object_pk", flat=True)), [post.pk])
+
+            Post.objects.filter(pk=post.pk).update(is_useful=False)
+            self.assertEqual(self.manager.process_outbox(), 1)
+            self.manager.refresh_index()
+
+            results = self.manager.setup_search(Search().query(MatchAll())).execute()
+            self.assertEqual([hit.is_useful for hit in results if hit.meta.doc_type == "post"], [False])
+
+    def test_buffered_operations(self):
+        """Test that deletions and partial updates are sent at once, when the transaction is committed"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        topic = TopicFactory(forum=self.forum, author=self.user)
+        posts = [PostFactory(topic=topic, author=self.user, position=position) for position in range(1, 4)]
+        self.manager.es_bulk_indexing_of_model(Topic)
+        self.manager.es_bulk_indexing_of_model(Post)
+        not_indexed_post = PostFactory(topic=topic, author=self.user, position=4)
+        self.manager.refresh_index()
+
+        with self.captureOnCommitCallbacks(execute=True), buffered_es_operations():
+            posts[0].hide_comment_by_user(self.staff, "Spam")
+            posts[1].delete()
+            not_indexed_post.delete()
+
+            # nothing was sent yet
+            self.manager.refresh_index()
+            results = self.manager.setup_search(Search().query(MatchAll())).execute()
+            self.assertEqual(len(results), 4)
+
+        self.manager.refresh_index()
+        results = self.manager.setup_search(Search().query(MatchAll())[:10]).execute()
+        indexed_posts = {hit.meta.id: hit for hit in results if hit.meta.doc_type == "post"}
+        self.assertEqual(set(indexed_posts), {posts[0].es_id, posts[2].es_id})
+        self.assertFalse(indexed_posts[posts[0].es_id].is_visible)
+
     def tearDown(self):
         super().tearDown()
 
         # delete index:
         self.manager.clear_es_index()
+
+
+@override_settings(ES_ENABLED=True, ES_SEARCH_INDEX={"name": "zds_search_state_test", "shards": 1, "replicas": 0})
+@mock.patch("zds.searchv2.models.connections.get_connection")
+class ESClusterStateTests(TestCase):
+    def setUp(self):
+        # start from a state which was never checked
+        for states in ("_cluster_states", "_index_managers"):
+            patcher = mock.patch.dict(f"zds.searchv2.models.{states}", clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_state_is_shared(self, mock_get_connection):
+        es = mock_get_connection.return_value
+        es.indices.exists.return_value = True
+
+        manager = get_index_manager()
+        self.assertIs(get_index_manager(), manager)
+        other_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+
+        self.assertTrue(manager.connected_to_es)
+        self.assertTrue(other_manager.index_exists)
+        self.assertEqual(es.info.call_count, 1)
+        self.assertEqual(es.indices.exists.call_count, 1)
+
+        # changes made by a manager are seen by the others
+        other_manager.index_exists = False
+        self.assertFalse(manager.index_exists)
+
+        # the state is only checked again when asked, or once stale
+        manager.refresh_cluster_state(force=True)
+        self.assertTrue(manager.index_exists)
+        self.assertEqual(es.info.call_count, 2)
+
+    def test_lost_connection(self, mock_get_connection):
+        es = mock_get_connection.return_value
+        es.indices.exists.return_value = True
+        es.delete.side_effect = ConnectionError("N/A", "unreachable", None)
+
+        manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.assertTrue(manager.connected_to_es)
+
+        topic = mock.Mock(es_id="1", **{"get_es_document_type.return_value": "topic"})
+        manager.delete_document(topic)
+        self.assertIsNone(manager.state.checked_at)
+
+        # the connectivity is checked again as soon as it is needed
+        es.info.side_effect = ConnectionError("N/A", "unreachable", None)
+        self.assertFalse(manager.connected_to_es)
+        self.assertEqual(es.info.call_count, 2)
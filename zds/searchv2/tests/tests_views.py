@@ -98,6 +98,11 @@ class ViewsTests(TutorialTestMixin, TestCase):
 
         self.assertEqual(response.hits.total, 4)  # get 4 results
 
+        # facets are given with the results
+        facets = result.context["facets"]
+        self.assertEqual(facets["types"], {"topic": 1, "post": 1, "publishedcontent": 1, "chapter": 1})
+        self.assertEqual(facets["groups"], {"content": 2, "topic": 1, "post": 1})
+
         # 2. Test filtering:
         topic_1 = Topic.objects.get(pk=topic_1.pk)
         post_1 = Post.objects.get(pk=post_1.pk)
@@ -123,6 +128,35 @@ class ViewsTests(TutorialTestMixin, TestCase):
                 self.assertIn(r.meta.doc_type, group_to_model[doc_type])  # … and only of the right type …
                 self.assertEqual(r.meta.id, ids[doc_type][i])  # … with the right id !
 
+    def test_texts_are_only_highlighted(self):
+        """The texts are not part of the results, but are still highlighted"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        text = "Clem est la meilleure mascotte"
+
+        topic = TopicFactory(forum=self.forum, author=self.user, title="Test")
+        post = PostFactory(topic=topic, author=self.user, position=1)
+        post.text = post.text_html = text
+        post.save()
+
+        self.manager.es_bulk_indexing_of_model(Topic)
+        self.manager.es_bulk_indexing_of_model(Post)
+        self.manager.refresh_index()
+
+        result = self.client.get(
+            reverse("search:query") + "?q=mascotte&models=" + Post.get_es_document_type(), follow=False
+        )
+        self.assertEqual(result.status_code, 200)
+
+        response = result.context["object_list"].execute()
+        self.assertEqual(response.hits.total, 1)
+        self.assertNotIn("text_html", response[0])
+        self.assertEqual(response[0].topic_title, topic.title)
+        self.assertIn("[hl]mascotte[/hl]", response[0].meta.highlight.text_html[0])
+        self.assertContains(result, '<mark class="highlighted">mascotte</mark>')
+
     def test_get_similar_topics(self):
         """Get similar topics lists"""
 
@@ -168,6 +202,69 @@ class ViewsTests(TutorialTestMixin, TestCase):
         content = json_handler.loads(result.content.decode("utf-8"))
         self.assertEqual(len(content["results"]), 2)
 
+    def test_similar_topics_are_boosted(self):
+        """Similar topics are ranked with the boosts of the search"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        locked = TopicFactory(forum=self.forum, author=self.user, title="Clem est verrouillée", is_locked=True)
+        normal = TopicFactory(forum=self.forum, author=self.user, title="Clem est normale")
+        sticky = TopicFactory(forum=self.forum, author=self.user, title="Clem est en post-it", is_sticky=True)
+
+        self.manager.es_bulk_indexing_of_model(Topic)
+        self.manager.refresh_index()
+
+        result = self.client.get(reverse("search:similar") + "?q=clem", follow=False)
+        content = json_handler.loads(result.content.decode("utf-8"))
+        self.assertEqual([topic["id"] for topic in content["results"]], [sticky.pk, normal.pk, locked.pk])
+
+    def test_similar_topics_in_hidden_forums(self):
+        """Topics of hidden forums are only suggested to the members of the group"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        group = Group.objects.create(name="Les illuminatis anonymes de ZdS")
+        _, hidden_forum = create_category_and_forum(group)
+        self.staff.groups.add(group)
+
+        TopicFactory(forum=hidden_forum, author=self.staff, title="Clem ne se mange pas")
+        TopicFactory(forum=self.forum, author=self.user, title="Clem est la meilleure mascotte")
+
+        self.manager.es_bulk_indexing_of_model(Topic)
+        self.manager.refresh_index()
+
+        result = self.client.get(reverse("search:similar") + "?q=cl", follow=False)
+        content = json_handler.loads(result.content.decode("utf-8"))
+        self.assertEqual([topic["title"] for topic in content["results"]], ["Clem est la meilleure mascotte"])
+
+        self.client.force_login(self.staff)
+        result = self.client.get(reverse("search:similar") + "?q=cl", follow=False)
+        content = json_handler.loads(result.content.decode("utf-8"))
+        self.assertEqual(len(content["results"]), 2)
+
+    def test_get_content_suggestions(self):
+        """Get suggestions of contents, as the title is typed"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        article = PublishedContentFactory(type="ARTICLE", title="Apprenez à programmer en Python")
+        other_article = PublishedContentFactory(type="ARTICLE", title="Python pour les nuls")
+
+        self.manager.es_bulk_indexing_of_model(PublishedContent)
+        self.manager.refresh_index()
+
+        result = self.client.get(reverse("search:suggestion") + "?q=pyth", follow=False)
+        self.assertEqual(result.status_code, 200)
+        content = json_handler.loads(result.content.decode("utf-8"))
+        self.assertEqual({suggestion["id"] for suggestion in content["results"]}, {article.pk, other_article.pk})
+
+        result = self.client.get(reverse("search:suggestion") + f"?q=pyth&excluded={article.pk}", follow=False)
+        content = json_handler.loads(result.content.decode("utf-8"))
+        self.assertEqual([suggestion["id"] for suggestion in content["results"]], [other_article.pk])
+
     def test_hidden_post_are_not_result(self):
         """Hidden posts should not show up in the search results"""
 
@@ -1,6 +1,7 @@
 from zds import json_handler
 import operator
 
+from elasticsearch import ConnectionError
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import Match, MultiMatch, FunctionScore, Term, Terms, Range
 
@@ -14,8 +15,9 @@ from django.urls import reverse
 from django.views.generic import CreateView
 from django.views.generic.detail import SingleObjectMixin
 
+from zds.searchv2.cache import CachedSearch, get_completions
 from zds.searchv2.forms import SearchForm
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.models import get_index_manager
 from zds.utils.paginator import ZdSPagingListView
 from zds.utils.templatetags.authorized_forums import get_authorized_forums
 from functools import reduce
@@ -30,7 +32,7 @@ class SimilarTopicsView(CreateView, SingleObjectMixin):
         """Overridden because the index manager must NOT be initialized elsewhere."""
 
         super().__init__(**kwargs)
-        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.index_manager = get_index_manager()
 
     def get(self, request, *args, **kwargs):
         if "q" in request.GET:
@@ -40,32 +42,36 @@ class SimilarTopicsView(CreateView, SingleObjectMixin):
         if self.index_manager.connected_to_es and self.search_query:
             self.authorized_forums = get_authorized_forums(self.request.user)
 
-            search_queryset = Search()
-            query = (
-                Match(_type="topic")
-                & Terms(forum_pk=self.authorized_forums)
-                & MultiMatch(query=self.search_query, fields=["title", "subtitle", "tags"])
-            )
-
-            functions_score = [
-                {"filter": Match(is_solved=True), "weight": settings.ZDS_APP["search"]["boosts"]["topic"]["if_solved"]},
-                {"filter": Match(is_sticky=True), "weight": settings.ZDS_APP["search"]["boosts"]["topic"]["if_sticky"]},
-                {"filter": Match(is_locked=True), "weight": settings.ZDS_APP["search"]["boosts"]["topic"]["if_locked"]},
-            ]
-
-            scored_query = FunctionScore(query=query, boost_mode="multiply", functions=functions_score)
-            search_queryset = search_queryset.query(scored_query)[:10]
+            # Completion of the title, among the topics of the forums the user is allowed to visit
+            topics = []
+            if self.authorized_forums:
+                topics = get_completions(
+                    self.index_manager,
+                    "topic_title_suggest",
+                    self.search_query,
+                    settings.ZDS_APP["search"]["autocompletion"]["results"],
+                    contexts={"forum_pk": [str(pk) for pk in sorted(self.authorized_forums)]},
+                    source=[
+                        "pk",
+                        "get_absolute_url",
+                        "title",
+                        "subtitle",
+                        "forum_title",
+                        "forum_get_absolute_url",
+                        "pubdate",
+                    ],
+                )
 
             # Build the result
-            for hit in search_queryset.execute():
+            for topic in topics:
                 result = {
-                    "id": hit.pk,
-                    "url": str(hit.get_absolute_url),
-                    "title": str(hit.title),
-                    "subtitle": str(hit.subtitle),
-                    "forumTitle": str(hit.forum_title),
-                    "forumUrl": str(hit.forum_get_absolute_url),
-                    "pubdate": str(hit.pubdate),
+                    "id": topic["pk"],
+                    "url": str(topic["get_absolute_url"]),
+                    "title": str(topic["title"]),
+                    "subtitle": str(topic["subtitle"]),
+                    "forumTitle": str(topic["forum_title"]),
+                    "forumUrl": str(topic["forum_get_absolute_url"]),
+                    "pubdate": str(topic["pubdate"]),
                 }
                 results.append(result)
 
@@ -82,7 +88,7 @@ class SuggestionContentView(CreateView, SingleObjectMixin):
         """Overridden because the index manager must NOT be initialized elsewhere."""
 
         super().__init__(**kwargs)
-        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.index_manager = get_index_manager()
 
     def get(self, request, *args, **kwargs):
         if "q" in request.GET:
@@ -92,41 +98,32 @@ class SuggestionContentView(CreateView, SingleObjectMixin):
         if self.index_manager.connected_to_es and self.search_query:
             self.authorized_forums = get_authorized_forums(self.request.user)
 
-            search_queryset = Search()
-            if len(excluded_content_ids) > 0 and excluded_content_ids != [""]:
-                search_queryset = search_queryset.exclude("terms", content_pk=excluded_content_ids)
-            query = Match(_type="publishedcontent") & MultiMatch(
-                query=self.search_query, fields=["title", "description"]
-            )
+            excluded_content_ids = [pk for pk in excluded_content_ids if pk]
+            size = settings.ZDS_APP["search"]["autocompletion"]["results"]
 
-            functions_score = [
-                {
-                    "filter": Match(content_type="TUTORIAL"),
-                    "weight": settings.ZDS_APP["search"]["boosts"]["publishedcontent"]["if_tutorial"],
-                },
-                {
-                    "filter": Match(content_type="ARTICLE"),
-                    "weight": settings.ZDS_APP["search"]["boosts"]["publishedcontent"]["if_article"],
-                },
-                {
-                    "filter": Match(content_type="OPINION"),
-                    "weight": settings.ZDS_APP["search"]["boosts"]["publishedcontent"]["if_opinion"],
-                },
-            ]
-
-            scored_query = FunctionScore(query=query, boost_mode="multiply", functions=functions_score)
-            search_queryset = search_queryset.query(scored_query)[:10]
+            # Completion of the title (excluded contents are filtered afterwards)
+            contents = get_completions(
+                self.index_manager,
+                "content_title_suggest",
+                self.search_query,
+                size + len(excluded_content_ids),
+                source=["content_pk", "publication_date", "title", "description"],
+            )
 
             # Build the result
-            for hit in search_queryset.execute():
+            for content in contents:
+                if str(content["content_pk"]) in excluded_content_ids:
+                    continue
                 result = {
-                    "id": hit.content_pk,
-                    "pubdate": hit.publication_date,
-                    "title": str(hit.title),
-                    "description": str(hit.description),
+                    "id": content["content_pk"],
+                    "pubdate": content["publication_date"],
+                    "title": str(content["title"]),
+                    "description": str(content["description"]),
                 }
                 results.append(result)
 
+            results = results[:size]
+
         data = {"results": results}
 
         return HttpResponse(json_handler.dumps(data), content_type="application/json")
@@ -148,11 +145,36 @@ class SearchView(ZdSPagingListView):
 
     index_manager = None
 
+    # fields of the documents needed to display the results (the texts only appear through the highlighting):
+    displayed_fields = [
+        "pk",
+        "title",
+        "subtitle",
+        "description",
+        "tags",
+        "thumbnail",
+        "content_pk",
+        "content_type",
+        "picked",
+        "publication_date",
+        "pubdate",
+        "get_absolute_url",
+        "get_absolute_url_online",
+        "forum_pk",
+        "forum_title",
+        "forum_get_absolute_url",
+        "topic_pk",
+        "topic_title",
+        "parent_title",
+        "parent_get_absolute_url_online",
+        "parent_publication_date",
+    ]
+
     def __init__(self, **kwargs):
         """Overridden because the index manager must NOT be initialized elsewhere."""
 
         super().__init__(**kwargs)
-        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.index_manager = get_index_manager()
 
     def get(self, request, *args, **kwargs):
         """Overridden to catch the request and fill the form."""
@@ -220,14 +242,35 @@ class SearchView(ZdSPagingListView):
             scored_queryset = FunctionScore(query=queryset, boost_mode="multiply", functions=weight_functions)
             search_queryset = search_queryset.query(scored_queryset)
 
-            # Highlighting:
+            # Highlighting (which gives the beginning of the text if nothing matches in it):
             search_queryset = search_queryset.highlight_options(
-                fragment_size=150, number_of_fragments=5, pre_tags=["[hl]"], post_tags=["[/hl]"]
+                fragment_size=150, number_of_fragments=5, no_match_size=150, pre_tags=["[hl]"], post_tags=["[/hl]"]
             )
             search_queryset = search_queryset.highlight("text").highlight("text_html")
 
-            # Executing:
-            return self.index_manager.setup_search(search_queryset)
+            # Only fetch what is displayed:
+            search_queryset = search_queryset.source(self.displayed_fields)
+
+            # Facets, computed with the results:
+            search_queryset.aggs.bucket("types", "terms", field="_type")
+            search_queryset.aggs.bucket("categories", "terms", field="categories")
+
+            # Executing (the results are cached for a short time, per query and set of visible forums):
+            cache_key_parts = [
+                " ".join(self.search_query.lower().split()),
+                sorted(models),
+                self.content_category,
+                self.content_subcategory,
+                self.from_library,
+                sorted(self.authorized_forums),
+                settings.ZDS_APP["search"]["boosts"],
+            ]
+            return CachedSearch(
+                self.index_manager.setup_search(search_queryset),
+                self.index_manager.index,
+                cache_key_parts,
+                count_slice=self.get_page_slice(),
+            )
 
         return []
 
@@ -347,8 +390,52 @@ class SearchView(ZdSPagingListView):
 
         return scored_query
 
+    def get_page_slice(self):
+        """Get the slice of the results displayed on the requested page, which is executed to count the results (so
+        that the page, its count and its facets are obtained with a single request).
+
+        :rtype: slice
+        """
+
+        page = self.request.GET.get(self.page_kwarg, "1")
+        if not page.isdigit() or int(page) < 1:
+            return None
+
+        start = (int(page) - 1) * self.paginate_by
+        return slice(start, start + self.paginate_by)
+
+    def get_facets(self, response):
+        """Get the number of results per type of document, per group of types (as in the form) and per category.
+
+        :param response: the response to the search
+        :type response: elasticsearch_dsl.response.Response
+        :rtype: dict
+        """
+
+        aggregations = response.to_dict().get("aggregations", {})
+        types = {bucket["key"]: bucket["doc_count"] for bucket in aggregations.get("types", {}).get("buckets", [])}
+        groups = {
+            group: sum(types.get(doc_type, 0) for doc_type in doc_types)
+            for group, (_, doc_types) in settings.ZDS_APP["search"]["search_groups"].items()
+        }
+        categories = {
+            bucket["key"]: bucket["doc_count"] for bucket in aggregations.get("categories", {}).get("buckets", [])
+        }
+
+        return {"types": types, "groups": groups, "categories": categories}
+
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+        try:
+            context = super().get_context_data(**kwargs)
+            if isinstance(context["object_list"], CachedSearch):
+                context["facets"] = self.get_facets(context["object_list"].execute())
+        except ConnectionError:
+            # the cluster became unreachable since its state was checked
+            self.index_manager.mark_disconnected()
+            messages.warning(self.request, _("Impossible de se connecter à Elasticsearch"))
+            self.object_list = []
+            context = super().get_context_data(**kwargs)
+
         context["form"] = self.search_form
         context["query"] = self.search_query is not None
 
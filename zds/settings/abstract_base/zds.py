@@ -193,6 +193,23 @@ ZDS_APP = {
             "katex": BASE_DIR / "dist" / "css" / "katex.min.css",
         },
         "latex_template_repo": "NOT_EXISTING_DIR",
+        # see `zds.utils.cache.TwoTierCache` for the options
+        "manifest_cache": {
+            "enabled": True,
+            "backend": "default",
+            "timeout": 60 * 60 * 24 * 7,
+            "local_max_entries": 256,
+        },
+        "file_cache": {
+            "enabled": True,
+            # total size of the files of the public versions kept in memory by each process
+            "max_bytes": 32 * 1024 * 1024,
+        },
+        "repository_pool": {
+            "enabled": True,
+            # number of repositories kept open by each thread
+            "max_entries": 16,
+        },
     },
     "forum": {
         "posts_per_page": 21,
@@ -209,6 +226,8 @@ ZDS_APP = {
         "top_tag_exclu": ["bug", "suggestion", "tutoriel", "beta", "article"],
         "greetings": ["salut", "bonjour", "yo ", "hello", "bon matin", "tout le monde se secoue"],
         "description_size": 120,
+        # in seconds, delay for the other processes to see that the forums readable by a group changed
+        "authorized_forums_version_ttl": 5,
     },
     "topic": {
         "home_number": 5,
@@ -228,6 +247,43 @@ ZDS_APP = {
     "search": {
         "mark_keywords": ["javafx", "haskell", "groovy", "powershell", "latex", "linux", "windows"],
         "results_per_page": 20,
+        # in seconds, after which the connectivity to ES and the existence of the index are checked again
+        "cluster_state_ttl": 30,
+        # record the changes of indexed objects in `ESIndexOutbox`, consumed by `es_manager index_outbox`
+        "outbox_enabled": zds_config.get("es_outbox_enabled", False),
+        "outbox_batch_size": 500,
+        # send the deletions and partial updates of documents made during a request in a single bulk request
+        "buffer_operations": True,
+        # sizing of the bulk requests sent when indexing (see `zds.searchv2.bulk.BulkController`)
+        "bulk": {
+            "initial_batch_size": 100,
+            "min_batch_size": 10,
+            "max_batch_size": 2000,
+            "additive_step": 50,
+            "decrease_factor": 0.5,
+            # in seconds, above which a bulk request is considered as slow
+            "target_latency": 2,
+            "max_bytes": 10 * 1024 * 1024,
+            "max_retries": 5,
+            # in seconds, doubled after each retry
+            "backoff": 0.5,
+            "request_timeout": 30,
+        },
+        # results of the searches, invalidated when the index is refreshed
+        "results_cache": {
+            "enabled": True,
+            "backend": "default",
+            # in seconds
+            "timeout": 60,
+        },
+        # completion of the titles of topics and contents, as the user types (see `ESIndexManager.suggest()`)
+        "autocompletion": {
+            "results": 10,
+            # number of words of the title at which the completion may start
+            "max_inputs": 8,
+            # in seconds, per prefix
+            "cache_timeout": 300,
+        },
         "search_groups": {
             "content": (_("Contenus publiés"), ["publishedcontent", "chapter"]),
             "topic": (_("Sujets du forum"), ["topic"]),
@@ -262,6 +318,42 @@ ZDS_APP = {
     },
     "visual_changes": [],
     "display_search_bar": True,
-    "zmd": {"server": "http://127.0.0.1:27272", "disable_pings": False},
+    "zmd": {
+        "server": "http://127.0.0.1:27272",
+        "disable_pings": False,
+        "client": {
+            # maximum number of keep-alive connections to zmd kept by each process
+            "pool_size": zds_config.get("zmd_pool_size", 10),
+            # in seconds, "manifest" is used when rendering a whole content
+            "timeouts": {"html": 10, "epub": 10, "tex": 120, "texfile": 120, "manifest": 120},
+            "max_attempts": 3,
+            # number of parallel requests used by `render_markdown_many`
+            "batch_workers": 4,
+            # in bytes, size of the chunks read by `render_markdown_to_file`
+            "stream_chunk_size": 64 * 1024,
+            "backoff_base": 0.1,
+            "backoff_max": 2,
+            # consecutive failures after which zmd is no longer queried for `breaker_cooldown` seconds
+            "breaker_failure_threshold": 5,
+            "breaker_cooldown": 30,
+        },
+        # see `zds.utils.cache.TwoTierCache` for the options, and `formats` for the output formats to cache
+        "render_cache": {
+            "enabled": zds_config.get("zmd_render_cache_enabled", True),
+            "backend": "default",
+            "timeout": 60 * 60 * 24,
+            "local_max_entries": 512,
+            "formats": ["html"],
+        },
+        "singleflight": {
+            # concurrent identical renderings of a process wait for a single zmd request
+            "enabled": True,
+            # also coalesce cacheable renderings across processes, with a lock in the render cache backend
+            "shared_lock": zds_config.get("zmd_singleflight_shared_lock", False),
+            # in seconds, after which waiting renderings query zmd themselves
+            "wait_timeout": 10,
+            "poll_interval": 0.05,
+        },
+    },
     "very_top_banner": {},
 }
@@ -1,6 +1,16 @@
+from .abstract_base.zds import ZDS_APP
+
 DEBUG = False
 
 PASSWORD_HASHERS = (
     "django.contrib.auth.hashers.MD5PasswordHasher",
     "django.contrib.auth.hashers.SHA1PasswordHasher",
 )
+
+# markdown renderings are not cached between tests, as some of them mock the markdown server
+ZDS_APP["zmd"]["render_cache"]["enabled"] = False
+# nor are the results of the searches, as the tests reuse the same queries with different data
+ZDS_APP["search"]["results_cache"]["enabled"] = False
+# the operations on the search index are sent as soon as they are made, as the transactions of the tests are never
+# committed
+ZDS_APP["search"]["buffer_operations"] = False
@@ -0,0 +1,180 @@
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from git import Repo
+
+from zds.utils.cache import TwoTierCache
+
+FULL_SHA = re.compile(r"^[0-9a-f]{40}$")
+
+
+class ManifestCache(TwoTierCache):
+    """
+    Cache of the parsed manifests of the versions of the contents, configured by
+    ``ZDS_APP["content"]["manifest_cache"]``.
+
+    A version of a content never changes, so entries are keyed by the pk of the
+    content and the sha of the version, and never invalidated.
+    """
+
+    def __init__(self):
+        super().__init__("content-manifest", ("content", "manifest_cache"))
+
+    def is_cacheable(self, sha):
+        """Only full shas are cached, as other revisions (branches, ``HEAD``, ...) can move."""
+        return self.config["enabled"] and sha is not None and FULL_SHA.match(str(sha)) is not None
+
+
+manifest_cache = ManifestCache()
+
+
+class FileCache:
+    """
+    In-process cache of the texts of the files of the public versions of the contents.
+
+    Entries are keyed by path and validated by the modification time, the size and
+    the inode of the file, so that a read costs a single ``stat`` as long as the file
+    is not replaced (as it is on publication). The least recently used entries are
+    evicted when their total size exceeds ``ZDS_APP["content"]["file_cache"]["max_bytes"]``.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def config(self):
+        return settings.ZDS_APP["content"]["file_cache"]
+
+    def read_text(self, path):
+        """
+        Returns the text of the file, read as UTF-8.
+
+        :param path: path of the file
+        :type path: str
+        :raise OSError: if the file cannot be read
+        :rtype: str
+        """
+        path = str(path)
+        if not self.config["enabled"]:
+            return self._read(path)
+
+        stat = os.stat(path)
+        validator = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == validator:
+                self._entries.move_to_end(path)
+                self.stats["hits"] += 1
+                return entry[1]
+
+        self.stats["misses"] += 1
+        text = self._read(path)
+        if stat.st_size <= self.config["max_bytes"]:
+            self._remember(path, validator, text, stat.st_size)
+        return text
+
+    def clear(self):
+        """Empties the cache and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.stats.clear()
+
+    @staticmethod
+    def _read(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def _remember(self, path, validator, text, size):
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._size -= previous[2]
+            self._entries[path] = (validator, text, size)
+            self._size += size
+            while self._size > self.config["max_bytes"]:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+
+file_cache = FileCache()
+
+
+class RepositoryPool:
+    """
+    Pool of the ``git.Repo`` of the repositories of the contents, keyed by path, so that
+    a repository is not opened again (with its git processes) each time it is used.
+
+    Each thread has its own LRU of at most ``ZDS_APP["content"]["repository_pool"]["max_entries"]``
+    repositories, as a ``Repo`` cannot be shared between threads. Entries are validated by the
+    inode and the modification time of the ``.git`` directory, which changes on each write,
+    so that a repository which was committed to, moved or recreated (by this process or
+    another one) is opened again. Writers also call ``invalidate()`` explicitly.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self.stats = Counter()
+
+    @property
+    def config(self):
+        return settings.ZDS_APP["content"]["repository_pool"]
+
+    def _get_entries(self):
+        entries = getattr(self._local, "entries", None)
+        if entries is None:
+            entries = self._local.entries = OrderedDict()
+        return entries
+
+    def get(self, path):
+        """
+        Returns the repository at ``path``.
+
+        :param path: path of the repository
+        :type path: str
+        :raise git.exc.NoSuchPathError: if there is no such directory
+        :raise git.exc.InvalidGitRepositoryError: if this is not a repository
+        :rtype: git.Repo
+        """
+        path = os.path.abspath(str(path))
+        if not self.config["enabled"]:
+            return Repo(path)
+
+        try:
+            stat = os.stat(os.path.join(path, ".git"))
+        except OSError:
+            return Repo(path)  # raises the relevant error
+
+        validator = (stat.st_ino, stat.st_mtime_ns)
+        entries = self._get_entries()
+        entry = entries.get(path)
+        if entry is not None and entry[0] == validator:
+            entries.move_to_end(path)
+            self.stats["hits"] += 1
+            return entry[1]
+
+        self.stats["misses"] += 1
+        repo = Repo(path)
+        entries[path] = (validator, repo)
+        entries.move_to_end(path)
+        while len(entries) > self.config["max_entries"]:
+            entries.popitem(last=False)  # its git processes are stopped once the last reference is dropped
+        return repo
+
+    def invalidate(self, path):
+        """Forgets the repository at ``path``, after it was written, moved or deleted."""
+        self._get_entries().pop(os.path.abspath(str(path)), None)
+
+    def clear(self):
+        """Forgets the repositories of this thread and resets the counters."""
+        self._get_entries().clear()
+        self.stats.clear()
+
+
+repository_pool = RepositoryPool()
@@ -12,8 +12,9 @@ from shutil import copy
 from django.template.loader import render_to_string
 from django.conf import settings
 
-from zds.tutorialv2.publish_container import publish_container
+from zds.tutorialv2.publish_container import publish_container, get_markdown_to_publish
 from zds.utils import old_slugify
+from zds.utils.templatetags.emarkdown import prerendered_markdown
 
 
 def __build_mime_type_conf():
@@ -69,17 +70,24 @@ def build_html_chapter_file(published_object, versioned_object, working_dir, roo
     """
     DirTuple = namedtuple("DirTuple", ["absolute", "relative"])
     img_dir = working_dir.parent / "images"
-    path_to_title_dict = publish_container(
-        published_object,
-        str(working_dir),
-        versioned_object,
-        template="tutorialv2/export/ebook/chapter.html",
-        file_ext="xhtml",
-        image_callback=image_handler.handle_images,
-        image_directory=DirTuple(str(img_dir.absolute()), str(img_dir.relative_to(root_dir))),
-        relative=".",
-        intro_ccl_template="tutorialv2/export/ebook/introduction.html",
-    )
+    image_directory = DirTuple(str(img_dir.absolute()), str(img_dir.relative_to(root_dir)))
+    # render every chapter in a few parallel requests instead of one request per extract
+    with prerendered_markdown(
+        get_markdown_to_publish(versioned_object),
+        output_format="epub",
+        images_download_dir=image_directory.absolute,
+    ):
+        path_to_title_dict = publish_container(
+            published_object,
+            str(working_dir),
+            versioned_object,
+            template="tutorialv2/export/ebook/chapter.html",
+            file_ext="xhtml",
+            image_callback=image_handler.handle_images,
+            image_directory=image_directory,
+            relative=".",
+            intro_ccl_template="tutorialv2/export/ebook/introduction.html",
+        )
     for container_path, title in path_to_title_dict.items():
         # TODO: check if a function exists in the std lib to get rid of `root_dir + '/'`
         yield container_path.replace(str(root_dir.absolute()) + "/", ""), "chapter-" + old_slugify(title), title
@@ -17,8 +17,8 @@ from django.urls import reverse
 from django.utils.http import urlencode
 from django.utils.translation import gettext_lazy as _
 from elasticsearch_dsl import Mapping, Q as ES_Q
-from elasticsearch_dsl.field import Text, Keyword, Date, Boolean
-from git import Repo, BadObject
+from elasticsearch_dsl.field import Text, Keyword, Date, Boolean, Completion
+from git import BadObject
 from gitdb.exc import BadName
 
 from zds import json_handler
@@ -30,12 +30,15 @@ from zds.searchv2.models import (
     AbstractESDjangoIndexable,
     AbstractESIndexable,
     delete_document_in_elasticsearch,
-    ESIndexManager,
+    get_completion_inputs,
+    get_completion_weight,
+    get_index_manager,
 )
 from zds.tutorialv2.managers import PublishedContentManager, PublishableContentManager, ReactionManager
 from zds.tutorialv2.models import TYPE_CHOICES, STATUS_CHOICES, CONTENT_TYPES_REQUIRING_VALIDATION, PICK_OPERATIONS
 from zds.tutorialv2.models.goals import Goal
 from zds.tutorialv2.models.mixins import TemplatableContentModelMixin, OnlineLinkableContentMixin
+from zds.tutorialv2.cache import file_cache, manifest_cache, repository_pool
 from zds.tutorialv2.models.versioned import NotAPublicVersion
 from zds.tutorialv2.utils import get_content_from_json, BadManifestError, get_blob
 from zds.utils import get_current_user
@@ -378,8 +381,7 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
             if sha != public.sha_public:
                 raise NotAPublicVersion
 
-            with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
-                manifest = json_handler.loads(f.read())
+            manifest = json_handler.loads(file_cache.read_text(os.path.join(path, "manifest.json")))
 
         else:  # draft version, use the repository (slower, but allows manipulation)
             path = self.get_repo_path()
@@ -387,7 +389,15 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
             if not os.path.isdir(path):
                 raise OSError(path)
 
-            repo = Repo(path)
+            # a version never changes, so its manifest is only read from the repository once
+            cacheable = manifest_cache.is_cacheable(sha)
+            if cacheable:
+                cache_key = manifest_cache.make_key(self.pk, sha)
+                manifest = manifest_cache.get(cache_key)
+                if manifest is not None:
+                    return manifest
+
+            repo = repository_pool.get(path)
             data = get_blob(repo.commit(sha).tree, "manifest.json")
             try:
                 manifest = json_handler.loads(data)
@@ -397,6 +407,9 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
                     _("Une erreur est survenue lors de la lecture du manifest.json, est-ce du JSON ?")
                 )
 
+            if cacheable:
+                manifest_cache.set(cache_key, manifest)
+
         return manifest
 
     def load_version(self, sha=None, public=None):
@@ -605,6 +618,7 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
         """
         if os.path.exists(self.get_repo_path()):
             shutil.rmtree(self.get_repo_path(), False)
+            repository_pool.invalidate(self.get_repo_path())
         if self.in_public() and self.public_version:
             if os.path.exists(self.public_version.get_prod_path()):
                 shutil.rmtree(self.public_version.get_prod_path())
@@ -757,6 +771,18 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
         self.versioned_model = self.content.load_version(sha=self.sha_public, public=self)
         return self.versioned_model
 
+    def load_es_public_version(self):
+        """Load the public version to index. It is only loaded once for a given ``sha_public``, so that building
+        the chapters and the document of a content during the same indexing batch do not parse it twice.
+
+        :rtype: zds.tutorialv2.models.versioned.VersionedContent
+        """
+        sha, versioned = getattr(self, "_es_public_version", (None, None))
+        if versioned is None or sha != self.sha_public:
+            versioned = self.load_public_version()
+            self._es_public_version = (self.sha_public, versioned)
+        return versioned
+
     def get_extra_contents_directory(self):
         """
         :return: path to all the 'extra contents'
@@ -1001,9 +1027,13 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
         mapping.field("tags", Text(boost=2.0))
         mapping.field("categories", Keyword(boost=1.5))
         mapping.field("subcategories", Keyword(boost=1.5))
-        mapping.field("text", Text())  # for article and mini-tuto, text is directly included into the main object
+        # for article and mini-tuto, text is directly included into the main object (only needed for the matching and
+        # the highlighting, so stored aside rather than in `_source`):
+        mapping.field("text", Text(store=True))
+        mapping.meta("_source", excludes=["text"])
         mapping.field("has_chapters", Boolean())  # ... otherwise, it is written
         mapping.field("picked", Boolean())
+        mapping.field("content_title_suggest", Completion())  # for the autocompletion of the titles
 
         # not indexed:
         mapping.field("get_absolute_url_online", Keyword(index=False))
@@ -1025,31 +1055,36 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
         )
 
     @classmethod
-    def get_es_indexable(cls, force_reindexing=False):
+    def get_es_children_document_types(cls):
+        return [FakeChapter.get_es_document_type()]
+
+    @classmethod
+    def get_es_indexable(cls, force_reindexing=False, pks=None, flagged_only=True):
         """Overridden to also include chapters"""
 
-        index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        index_manager = get_index_manager()
 
         # fetch initial batch
         last_pk = 0
-        objects_source = super().get_es_indexable(force_reindexing)
+        objects_source = super().get_es_indexable(force_reindexing, pks=pks, flagged_only=flagged_only)
         objects = list(objects_source.filter(pk__gt=last_pk)[: PublishedContent.objects_per_batch])
 
         while objects:
             chapters = []
 
+            # delete possible previous chapters of the whole batch at once (not needed when the index is rebuilt)
+            already_indexed = [content.es_id for content in objects if content.es_already_indexed]
+            if already_indexed and not force_reindexing:
+                index_manager.delete_by_query(
+                    FakeChapter.get_es_document_type(), ES_Q("terms", _routing=already_indexed)
+                )
+
             for content in objects:
-                versioned = content.load_public_version()
+                versioned = content.load_es_public_version()
 
                 # chapters are only indexed for middle and big tuto
                 if versioned.has_sub_containers():
 
-                    # delete possible previous chapters
-                    if content.es_already_indexed:
-                        index_manager.delete_by_query(
-                            FakeChapter.get_es_document_type(), ES_Q("match", _routing=content.es_id)
-                        )
-
                     # (re)index the new one(s)
                     for chapter in versioned.get_list_of_chapters():
                         chapters.append(FakeChapter(chapter, versioned, content.es_id))
@@ -1071,14 +1106,22 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
         """Overridden to handle the fact that most information are versioned"""
 
         excluded_fields = excluded_fields or []
-        excluded_fields.extend(["title", "description", "tags", "categories", "text", "thumbnail", "picked"])
+        excluded_fields.extend(
+            ["title", "description", "tags", "categories", "text", "thumbnail", "picked", "content_title_suggest"]
+        )
 
         data = super().get_es_document_source(excluded_fields=excluded_fields)
 
-        # fetch versioned information
-        versioned = self.load_public_version()
+        # fetch versioned information (already loaded if the chapters were built)
+        versioned = self.load_es_public_version()
 
         data["title"] = versioned.title
+        boosts = settings.ZDS_APP["search"]["boosts"]["publishedcontent"]
+        content_type_boosts = {"TUTORIAL": "if_tutorial", "ARTICLE": "if_article", "OPINION": "if_opinion"}
+        data["content_title_suggest"] = {
+            "input": get_completion_inputs(versioned.title),
+            "weight": get_completion_weight(boosts.get(content_type_boosts.get(self.content_type), 1)),
+        }
         data["description"] = versioned.description
         data["tags"] = [tag.title for tag in versioned.tags.all()]
 
@@ -1117,7 +1160,7 @@ def delete_published_content_in_elasticsearch(sender, instance, **kwargs):
     chapters.
     """
 
-    index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+    index_manager = get_index_manager()
 
     if index_manager.index_exists:
         index_manager.delete_by_query(FakeChapter.get_es_document_type(), ES_Q("match", _routing=instance.es_id))
@@ -1196,7 +1239,8 @@ class FakeChapter(AbstractESIndexable):
         mapping.meta("parent", type="publishedcontent")
 
         mapping.field("title", Text(boost=1.5))
-        mapping.field("text", Text())
+        mapping.field("text", Text(store=True))  # not in `_source`, as for `PublishedContent`
+        mapping.meta("_source", excludes=["text"])
         mapping.field("categories", Keyword(boost=1.5))
         mapping.field("subcategories", Keyword(boost=1.5))
 
@@ -3,7 +3,6 @@ import copy
 from pathlib import Path
 
 from zds import json_handler
-from git import Repo
 import os
 import shutil
 import codecs
@@ -17,7 +16,8 @@ from django.template.loader import render_to_string
 from zds.tutorialv2.models.mixins import TemplatableContentModelMixin
 from zds.tutorialv2.models import SINGLE_CONTAINER_CONTENT_TYPES, CONTENT_TYPES_BETA, CONTENT_TYPES_REQUIRING_VALIDATION
 from zds.tutorialv2.utils import default_slug_pool, export_content, get_commit_author, InvalidOperationError
-from zds.tutorialv2.utils import get_blob
+from zds.tutorialv2.cache import file_cache, repository_pool
+from zds.tutorialv2.utils import get_blob_index, read_blob, read_blobs
 from zds.utils.validators import InvalidSlugError, check_slug
 from zds.utils.misc import compute_hash
 from zds.utils.templatetags.emarkdown import emarkdown
@@ -428,13 +428,7 @@ class Container:
         :rtype: str
         """
         if self.introduction:
-            return (
-                get_blob(
-                    self.top_container().repository.commit(self.top_container().current_version).tree,
-                    self.introduction.replace("\\", "/"),
-                )
-                or ""
-            )
+            return self.top_container().get_versioned_text(self.introduction) or ""
         return ""
 
     def get_conclusion(self):
@@ -443,13 +437,7 @@ class Container:
         :rtype: str
         """
         if self.conclusion:
-            return (
-                get_blob(
-                    self.top_container().repository.commit(self.top_container().current_version).tree,
-                    self.conclusion.replace("\\", "/"),
-                )
-                or ""
-            )
+            return self.top_container().get_versioned_text(self.conclusion) or ""
         return ""
 
     def get_introduction_online(self):
@@ -461,9 +449,10 @@ class Container:
         :rtype: str
         """
         if self.introduction:
-            path = os.path.join(self.top_container().get_prod_path(), self.introduction)
-            if os.path.isfile(path):
-                return codecs.open(path, "r", encoding="utf-8").read()
+            try:
+                return file_cache.read_text(os.path.join(self.top_container().get_prod_path(), self.introduction))
+            except OSError:
+                pass
         return ""
 
     def get_conclusion_online(self):
@@ -475,14 +464,17 @@ class Container:
         :rtype: str
         """
         if self.conclusion:
-            path = os.path.join(self.top_container().get_prod_path(), self.conclusion)
-            if os.path.isfile(path):
-                return codecs.open(path, "r", encoding="utf-8").read()
+            try:
+                return file_cache.read_text(os.path.join(self.top_container().get_prod_path(), self.conclusion))
+            except OSError:
+                pass
         return ""
 
     def get_content_online(self):
-        if os.path.isfile(self.get_prod_path()):
-            return codecs.open(self.get_prod_path(), "r", encoding="utf-8").read()
+        try:
+            return file_cache.read_text(self.get_prod_path())
+        except OSError:
+            return None
 
     def compute_hash(self):
         """Compute an MD5 hash from the introduction and conclusion, for comparison purpose
@@ -1024,10 +1016,7 @@ class Extract:
         :rtype: str
         """
         if self.text:
-            return get_blob(
-                self.container.top_container().repository.commit(self.container.top_container().current_version).tree,
-                self.text.replace("\\", "/"),
-            )
+            return self.container.top_container().get_versioned_text(self.text)
         return ""
 
     def compute_hash(self):
@@ -1235,11 +1224,59 @@ class VersionedContent(Container, TemplatableContentModelMixin):
             self.slug_repository = slug
 
         if self.slug != "" and os.path.exists(self.get_path()):
-            self.repository = Repo(self.get_path())
+            self.repository = repository_pool.get(self.get_path())
+
+        self._blob_index = None
+        self._prefetched_texts = {}
 
     def __str__(self):
         return self.title
 
+    def _get_blob(self, path):
+        if self._blob_index is None or self._blob_index[0] != self.current_version:
+            tree = self.repository.commit(self.current_version).tree
+            self._blob_index = (self.current_version, get_blob_index(tree))
+
+        return self._blob_index[1].get(os.path.normpath(path.replace("\\", "/")))
+
+    def get_versioned_text(self, path):
+        """Get the text of a file in the current version.
+
+        The blobs of the version are indexed by their path the first time, so that getting all the texts of the
+        content only walks the git tree once.
+
+        :param path: path of the file, relative to the repository
+        :type path: str
+        :return: the text, or ``None`` if there is no such file
+        :rtype: str
+        """
+
+        blob = self._get_blob(path)
+        if blob is None:
+            return None
+        if blob.hexsha in self._prefetched_texts:
+            return self._prefetched_texts[blob.hexsha]
+        return read_blob(blob)
+
+    def prefetch_texts(self):
+        """Read the introductions, conclusions and extracts of the current version at once, in a single stream from
+        the repository, so that ``get_versioned_text()`` does not query it for each of them afterwards.
+        """
+
+        if self.repository is None:
+            return
+
+        paths = []
+        for child in self.traverse(only_container=False):
+            if isinstance(child, Container):
+                paths.extend(path for path in (child.introduction, child.conclusion) if path)
+            elif child.text:
+                paths.append(child.text)
+
+        blobs = [blob for blob in map(self._get_blob, paths) if blob is not None]
+        for sha, data in read_blobs(self.repository, blobs).items():
+            self._prefetched_texts[sha] = data.decode()
+
     def get_absolute_url(self, version=None):
         return TemplatableContentModelMixin.get_absolute_url(self, version)
 
@@ -1379,7 +1416,8 @@ class VersionedContent(Container, TemplatableContentModelMixin):
             self.slug = slug
             new_path = self.get_path(use_current_slug=True)
             shutil.move(old_path, new_path)
-            self.repository = Repo(new_path)
+            repository_pool.invalidate(old_path)
+            self.repository = repository_pool.get(new_path)
             self.slug_repository = slug
 
         return self.repo_update(title, introduction, conclusion, commit_message=commit_message, do_commit=do_commit)
@@ -1392,6 +1430,7 @@ class VersionedContent(Container, TemplatableContentModelMixin):
         :rtype: str
         """
         cm = self.repository.index.commit(commit_message, **get_commit_author())
+        repository_pool.invalidate(self.repository.working_tree_dir)
 
         self.sha_draft = cm.hexsha
         self.current_version = cm.hexsha
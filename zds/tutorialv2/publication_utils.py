@@ -22,7 +22,7 @@ from zds.tutorialv2.publish_container import publish_use_manifest
 from zds.tutorialv2.signals import content_unpublished
 from zds.tutorialv2.utils import export_content
 from zds.forum.utils import send_post, lock_topic
-from zds.utils.templatetags.emarkdown import render_markdown
+from zds.utils.templatetags.emarkdown import render_markdown_to_file
 from zds.utils.templatetags.smileys_def import SMILEYS_BASE_PATH, LICENSES_BASE_PATH
 
 logger = logging.getLogger(__name__)
@@ -387,14 +387,16 @@ class ZMarkdownRebberLatexPublicator(Publicator):
         replacement_image_url = str(settings.MEDIA_ROOT.parent)
         if not replacement_image_url.endswith("/"):
             replacement_image_url += "/"
-        replaced_media_url = settings.MEDIA_URL
-        if replaced_media_url.startswith("/"):
-            replaced_media_url = replaced_media_url[1:]
         exported = export_content(public_versionned_source, with_text=True, ready_to_publish_only=True)
         # no title to avoid zmd to put it on the final latex
         del exported["title"]
-        content, metadata, messages = render_markdown(
+        true_latex_extension = ".".join(self.extension.split(".")[:-1]) + ".tex"
+        latex_file_path = base_name + true_latex_extension
+        pdf_file_path = base_name + self.extension
+        # the document may be huge, it is written to the disk while zmd sends it
+        written, metadata, messages = render_markdown_to_file(
             exported,
+            latex_file_path,
             output_format="texfile",
             # latex template arguments
             content_type=content_type,
@@ -409,24 +411,18 @@ class ZMarkdownRebberLatexPublicator(Publicator):
             local_url_to_local_path=["/", replacement_image_url],
             heading_shift=-1,
         )
-        if content == "" and messages:
+        if written == 0 and messages:
             raise FailureDuringPublication(f"Markdown was not parsed due to {messages}")
         zmd_class_dir_path = Path(settings.ZDS_APP["content"]["latex_template_repo"])
-        content.replace(replacement_image_url + replaced_media_url, replacement_image_url)
         if zmd_class_dir_path.exists() and zmd_class_dir_path.is_dir():
             with contextlib.suppress(FileExistsError):
                 zmd_class_link = base_directory / "zmdocument.cls"
                 zmd_class_link.symlink_to(zmd_class_dir_path / "zmdocument.cls")
                 luatex_dir_link = base_directory / "utf8.lua"
                 luatex_dir_link.symlink_to(zmd_class_dir_path / "utf8.lua", target_is_directory=True)
-        true_latex_extension = ".".join(self.extension.split(".")[:-1]) + ".tex"
-        latex_file_path = base_name + true_latex_extension
-        pdf_file_path = base_name + self.extension
         default_logo_original_path = Path(__file__).parent / ".." / ".." / "assets" / "images" / "logo@2x.png"
         with contextlib.suppress(FileExistsError):
             shutil.copy(str(default_logo_original_path), str(base_directory / "default_logo.png"))
-        with open(latex_file_path, mode="w", encoding="utf-8") as latex_file:
-            latex_file.write(content)
         shutil.copy2(latex_file_path, published_content_entity.get_extra_contents_directory())
 
         self.full_tex_compiler_call(latex_file_path, draftmode="-draftmode")
@@ -235,6 +235,29 @@ def publish_container(
     return path_to_title_dict
 
 
+def get_markdown_to_publish(container):
+    """
+    Yields the markdown texts (introductions, extracts and conclusions) that ``publish_container``
+    renders for ``container`` and its children which are ready to publish, so that they can be
+    rendered at once beforehand (see ``zds.utils.templatetags.emarkdown.prerendered_markdown``).
+
+    :param container: a given container
+    :type container: Container
+    """
+    from zds.tutorialv2.models.versioned import Container
+
+    if container.introduction:
+        yield container.get_introduction()
+    for child in container.children:
+        if not isinstance(child, Container):
+            if child.text:
+                yield child.get_text()
+        elif child.ready_to_publish:
+            yield from get_markdown_to_publish(child)
+    if container.conclusion:
+        yield container.get_conclusion()
+
+
 def write_chapter_file(base_dir, container, part_path, parsed, path_to_title_dict, image_callback=None):
     """
     Takes a chapter (i.e a set of extract gathers in one html text) and write in into the right file.
@@ -17,9 +17,11 @@ from zds.tutorialv2.tests.factories import (
     PublishedContentFactory,
 )
 from zds.gallery.tests.factories import UserGalleryFactory
+from zds.tutorialv2.cache import manifest_cache, repository_pool
 from zds.tutorialv2.models.database import PublishableContent, PublishedContent
 from zds.tutorialv2.publication_utils import publish_content
 from zds.tutorialv2.tests import TutorialTestMixin, override_for_contents
+from zds.tutorialv2.utils import get_blob, get_blob_index, read_blobs
 from zds.utils.tests.factories import SubCategoryFactory, LicenceFactory
 from zds.utils.models import Tag
 from django.template.defaultfilters import date
@@ -63,6 +65,71 @@ class ContentTests(TutorialTestMixin, TestCase):
         self.assertTrue(self.part1.slug in list(versioned.children_dict.keys()))
         self.assertTrue(self.chapter1.slug in versioned.children_dict[self.part1.slug].children_dict)
 
+    def test_get_versioned_text(self):
+        versioned = self.tuto.load_version()
+        tree = versioned.repository.commit(versioned.current_version).tree
+        extract = versioned.children[0].children[0].children[0]
+
+        self.assertEqual(extract.get_text(), get_blob(tree, extract.text))
+        self.assertEqual(versioned.get_introduction(), get_blob(tree, versioned.introduction))
+        self.assertIsNone(versioned.get_versioned_text("does/not/exist.md"))
+        self.assertIsNone(get_blob(tree, "does/not/exist.md"))
+
+        # the blobs are indexed once per version
+        index = versioned._blob_index
+        self.assertEqual(index[0], versioned.current_version)
+        versioned.get_conclusion()
+        self.assertIs(index, versioned._blob_index)
+
+    def test_prefetch_texts(self):
+        versioned = self.tuto.load_version()
+        extract = versioned.children[0].children[0].children[0]
+        text = extract.get_text()
+
+        versioned.prefetch_texts()
+        self.assertIn(versioned._get_blob(extract.text).hexsha, versioned._prefetched_texts)
+        self.assertEqual(extract.get_text(), text)
+
+        # the data read at once are the same as the ones read blob by blob
+        blobs = get_blob_index(versioned.repository.commit(versioned.current_version).tree).values()
+        data = read_blobs(versioned.repository, blobs)
+        self.assertEqual(len(data), len({blob.hexsha for blob in blobs}))
+        for blob in blobs:
+            self.assertEqual(data[blob.hexsha], blob.data_stream.read())
+
+    def test_manifest_cache(self):
+        manifest_cache.clear()
+        sha = self.tuto.sha_draft
+
+        versioned = self.tuto.load_version(sha)
+        self.assertEqual(manifest_cache.stats["misses"], 1)
+
+        # the manifest is not read again, and the modifications of a copy do not alter the cached one
+        versioned.title = "Un autre titre"
+        manifest = self.tuto.load_manifest(sha)
+        manifest["children"] = []
+        self.assertEqual(manifest_cache.stats["local_hits"], 1)
+
+        versioned = self.tuto.load_version(sha)
+        self.assertEqual(versioned.title, self.tuto_draft.title)
+        self.assertEqual(len(versioned.children), 1)
+        self.assertEqual(manifest_cache.stats["misses"], 1)
+
+        # revisions other than full shas are not cached
+        self.tuto.load_manifest("HEAD")
+        self.assertEqual(manifest_cache.stats["misses"], 1)
+
+    def test_repository_pool(self):
+        repository_pool.clear()
+        versioned = self.tuto.load_version()
+        self.assertIs(self.tuto.load_version().repository, versioned.repository)
+        self.assertEqual(repository_pool.stats["misses"], 1)
+
+        # the repository is opened again after a commit
+        versioned.repo_update("Un autre titre", "intro", "conclu")
+        self.assertIsNot(self.tuto.load_version().repository, versioned.repository)
+        self.assertEqual(repository_pool.stats["misses"], 2)
+
     def test_slug_pool(self):
         versioned = self.tuto.load_version()
 
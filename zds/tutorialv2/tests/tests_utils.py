@@ -1,10 +1,13 @@
+import copy
 import os
 import shutil
+import tempfile
 from pathlib import Path
 import datetime
 
 from django.conf import settings
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.urls import reverse
 
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
@@ -16,6 +19,7 @@ from zds.tutorialv2.tests.factories import (
     ContentReactionFactory,
 )
 from zds.gallery.tests.factories import UserGalleryFactory
+from zds.tutorialv2.cache import FileCache
 from zds.tutorialv2.models.versioned import Container
 from zds.tutorialv2.utils import (
     get_target_tagged_tree_for_container,
@@ -848,3 +852,53 @@ class UtilsExportOnlyReadyToPublishTests(TutorialTestMixin, TestCase):
         super().tearDown()
         PublicatorRegistry.registry = self.old_registry
         self.overridden_zds_app["content"]["build_pdf_when_published"] = self.old_build_pdf_when_published
+
+
+small_file_cache_zds_app = copy.deepcopy(settings.ZDS_APP)
+small_file_cache_zds_app["content"]["file_cache"] = {"enabled": True, "max_bytes": 10}
+
+
+@override_settings(ZDS_APP=small_file_cache_zds_app)
+class FileCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = FileCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_read_text(self):
+        path = self.write("a.html", "abc")
+        self.assertEqual(self.cache.read_text(path), "abc")
+        self.assertEqual(self.cache.read_text(path), "abc")
+        self.assertEqual(self.cache.stats["misses"], 1)
+        self.assertEqual(self.cache.stats["hits"], 1)
+
+        # a replaced file is read again
+        replacement = self.write("b.html", "abcd")
+        os.replace(replacement, path)
+        self.assertEqual(self.cache.read_text(path), "abcd")
+        self.assertEqual(self.cache.stats["misses"], 2)
+
+        with self.assertRaises(OSError):
+            self.cache.read_text(os.path.join(self.directory, "missing.html"))
+
+    def test_eviction(self):
+        first = self.write("a.html", "123456")
+        second = self.write("b.html", "123456")
+        too_large = self.write("c.html", "12345678901")
+
+        self.cache.read_text(first)
+        self.cache.read_text(second)  # the first one is evicted, as the budget is 10 bytes
+        self.cache.read_text(too_large)  # never kept
+        self.cache.read_text(second)
+        self.assertEqual(self.cache.stats["hits"], 1)
+        self.cache.read_text(first)
+        self.cache.read_text(too_large)
+        self.assertEqual(self.cache.stats["misses"], 5)
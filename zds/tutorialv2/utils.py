@@ -1,6 +1,8 @@
 from collections import OrderedDict, namedtuple
 import os
 import logging
+import subprocess
+import threading
 from urllib.parse import urlsplit, urlunsplit, quote
 from django.contrib.auth.models import User
 from django.http import Http404
@@ -9,6 +11,7 @@ from git import Repo, Actor
 
 from django.conf import settings
 from zds.tutorialv2 import signals
+from zds.tutorialv2.cache import repository_pool
 from zds.tutorialv2.models import CONTENT_TYPE_LIST
 from zds.utils import get_current_user
 from zds.utils.models import Licence
@@ -568,7 +571,7 @@ def clone_repo(old_path, new_path):
     """
     if not os.path.isdir(new_path):
         os.makedirs(new_path, mode=0o777)
-    old_repo = Repo(old_path)
+    old_repo = repository_pool.get(old_path)
     new_repo = old_repo.clone(new_path)
     return new_repo
 
@@ -677,6 +680,8 @@ def export_content(content, with_text=False, ready_to_publish_only=False):
     :return: dictionary containing the information
     :rtype: dict
     """
+    if with_text:
+        content.prefetch_texts()
     dct = export_container(content, with_text, ready_to_publish_only)
 
     # append metadata :
@@ -709,26 +714,95 @@ def get_blob(tree, path):
     :type tree: git.objects.tree.Tree
     :param path: Path to file
     :type path: str
-    :return: contains
-    :rtype: bytearray
+    :return: contains, or ``None`` if there is no such file
+    :rtype: str
     """
-    # get all extracts
-    for blob in tree.blobs:
-        try:
-            if os.path.abspath(blob.path) == os.path.abspath(path):
-                data = blob.data_stream.read().decode()
-                return data
-        except OSError:  # in case of deleted files, or the system cannot get the lock, juste return ""
-            return ""
-    # traverse directories when we are at root or in a part or chapter
-    if len(tree.trees) > 0:
-        for subtree in tree.trees:
-            result = get_blob(subtree, path)
-            if result is not None:
-                return result
+    try:
+        blob = tree.join(os.path.normpath(path))  # only reads the trees along the path
+    except KeyError:
         return None
-    else:
+    return read_blob(blob)
+
+
+def get_blob_index(tree):
+    """Map the path of each file of a tree (and its subtrees) to its blob, in a single traversal
+
+    :param tree: Git Tree object
+    :type tree: git.objects.tree.Tree
+    :return: the blobs, indexed by their path
+    :rtype: dict
+    """
+    return {item.path: item for item in tree.traverse() if item.type == "blob"}
+
+
+def read_blob(blob):
+    """Return the data contained into a blob
+
+    :param blob: Git Blob object
+    :type blob: git.objects.blob.Blob
+    :return: contains, or ``None`` if this is not a file
+    :rtype: str
+    """
+    if blob.type != "blob":
         return None
+    try:
+        return blob.data_stream.read().decode()
+    except OSError:  # in case of deleted files, or the system cannot get the lock, juste return ""
+        return ""
+
+
+def read_blobs(repo, blobs):
+    """Read the data of many blobs of a repository in a single ``git cat-file --batch`` stream.
+
+    All the shas are sent at once, instead of waiting for the data of each blob before asking for the next one, as
+    when reading ``blob.data_stream``.
+
+    :param repo: the repository
+    :type repo: git.Repo
+    :param blobs: the blobs to read
+    :type blobs: collections.Iterable[git.objects.blob.Blob]
+    :return: the data of each blob, indexed by its sha
+    :rtype: dict
+    """
+    shas = list(dict.fromkeys(blob.hexsha for blob in blobs))
+    if not shas:
+        return {}
+
+    process = repo.git.cat_file("--batch", as_process=True, istream=subprocess.PIPE)
+    # git answers while it reads the shas, so they are written by another thread to avoid filling both pipes
+    writer = threading.Thread(target=_write_shas, args=(process.stdin, shas))
+    writer.start()
+
+    data = {}
+    try:
+        for _ in shas:
+            header = process.stdout.readline().split()
+            if len(header) != 3:  # "<sha> missing"
+                continue
+            data[header[0].decode()] = process.stdout.read(int(header[2]))
+            process.stdout.read(1)  # newline after the data
+    except BaseException:
+        # stop git before waiting for the writer, which may be blocked on a full pipe
+        process.kill()
+        process.stdout.close()
+        writer.join()
+        raise
+
+    writer.join()
+    process.stdout.close()
+    process.wait()
+
+    return data
+
+
+def _write_shas(stream, shas):
+    try:
+        try:
+            stream.write("".join(f"{sha}\n" for sha in shas).encode())
+        finally:
+            stream.close()
+    except BrokenPipeError:  # git was stopped before reading all the shas
+        pass
 
 
 class BadArchiveError(Exception):
@@ -28,6 +28,7 @@ from zds.tutorialv2.utils import (
     BadManifestError,
     default_slug_pool,
     init_new_repo,
+    read_blobs,
 )
 from zds.utils.validators import InvalidSlugError
 from zds.utils.uuslug_wrapper import slugify
@@ -49,11 +50,10 @@ class DownloadContent(LoginRequiredMixin, SingleContentDownloadViewMixin):
         :param zip_file: a ``zipfile`` object (with writing permissions)
         :param git_tree: Git tree (from ``repository.commit(sha).tree``)
         """
-        for blob in git_tree.blobs:  # first, add files :
-            zip_file.writestr(blob.path, blob.data_stream.read())
-        if git_tree.trees:  # then, recursively add dirs :
-            for subtree in git_tree.trees:
-                DownloadContent.insert_into_zip(zip_file, subtree)
+        blobs = [item for item in git_tree.traverse() if item.type == "blob"]
+        data = read_blobs(git_tree.repo, blobs)  # in one stream, rather than one request per file
+        for blob in blobs:
+            zip_file.writestr(blob.path, data[blob.hexsha])
 
     def get_contents(self):
         """get the zip file stream
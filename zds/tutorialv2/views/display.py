@@ -30,16 +30,18 @@ from zds.tutorialv2.utils import search_container_or_404, last_participation_is_
 from zds.tutorialv2.views.containers_extracts import DisplayContainer
 from zds.tutorialv2.views.contents import DisplayContent
 from zds.tutorialv2.views.goals import EditGoalsForm
+from zds.utils.mixins import PrerenderedSignaturesMixin
 from zds.utils.models import CommentVote
 from zds.utils.paginator import make_pagination
 
 logger = logging.getLogger(__name__)
 
 
-class DisplayOnlineContent(FeatureableMixin, SingleOnlineContentDetailViewMixin):
+class DisplayOnlineContent(PrerenderedSignaturesMixin, FeatureableMixin, SingleOnlineContentDetailViewMixin):
     """Base class that can show any online content"""
 
     model = PublishedContent
+    messages_context_name = "reactions"
     template_name = "tutorialv2/view/content_online.html"
 
     current_content_type = ""
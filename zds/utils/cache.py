@@ -0,0 +1,91 @@
+import copy
+import logging
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class TwoTierCache:
+    """
+    Cache made of a bounded in-process LRU placed in front of a Django cache.
+
+    Values are looked up in the LRU of the process first, then in the Django cache
+    shared by the processes. The configuration is the dict of ``ZDS_APP`` found at
+    ``config_path``, with the keys ``enabled``, ``backend`` (name of the Django cache,
+    see ``CACHES``), ``timeout`` (in the Django cache) and ``local_max_entries``
+    (size of the LRU). Values are copied when they are stored and read, so that
+    callers are free to mutate them.
+    """
+
+    def __init__(self, key_prefix, config_path):
+        """
+        :param key_prefix: prefix of the keys made by ``make_key``
+        :type key_prefix: str
+        :param config_path: keys of the configuration in ``ZDS_APP``, e.g. ``("zmd", "render_cache")``
+        :type config_path: tuple
+        """
+        self.key_prefix = key_prefix
+        self.config_path = config_path
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def config(self):
+        config = settings.ZDS_APP
+        for key in self.config_path:
+            config = config[key]
+        return config
+
+    def make_key(self, *parts):
+        return ":".join(str(part) for part in (self.key_prefix, *parts))
+
+    def get(self, key):
+        """
+        Returns a copy of the value, or None on a cache miss.
+        """
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return copy.deepcopy(value)
+
+        try:
+            value = caches[self.config["backend"]].get(key)
+        except Exception:
+            logger.warning(f"Unable to read the {self.key_prefix} cache", exc_info=True)
+            value = None
+
+        if value is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["shared_hits"] += 1
+        self._remember(key, value)
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        self._remember(key, value)
+        try:
+            caches[self.config["backend"]].set(key, value, timeout=self.config["timeout"])
+        except Exception:
+            logger.warning(f"Unable to write to the {self.key_prefix} cache", exc_info=True)
+
+    def clear(self):
+        """Empties the in-process tier and resets the counters."""
+        with self._lock:
+            self._local.clear()
+            self.stats.clear()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.config["local_max_entries"]:
+                self._local.popitem(last=False)
@@ -0,0 +1,42 @@
+from django.core.management import BaseCommand
+
+from zds.utils.models import Comment
+from zds.utils.templatetags.emarkdown import render_markdown_many, rendering_failed
+
+
+class Command(BaseCommand):
+    help = "Store the rendering metadata (pings, ...) of the comments rendered before it was saved with them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Number of comments rendered per batch")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        comments = Comment.objects.filter(text_metadata__isnull=True).order_by("pk").only("pk", "text")
+        total = comments.count()
+        self.stdout.write(f"{total} comments to process")
+
+        done = 0
+        failed = 0
+        last_pk = 0
+        while True:
+            batch = list(comments.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+
+            renderings = render_markdown_many([comment.text for comment in batch])
+            rendered = []
+            for comment, (_, metadata, messages) in zip(batch, renderings):
+                if rendering_failed(messages):  # left to NULL, to be rendered again later
+                    failed += 1
+                    continue
+                comment.text_metadata = Comment.filter_metadata(metadata)
+                rendered.append(comment)
+            Comment.objects.bulk_update(rendered, ["text_metadata"])
+
+            done += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"{done}/{total} comments processed")
+
+        if failed:
+            self.stdout.write(f"{failed} comments could not be rendered, run this command again to process them")
@@ -0,0 +1,128 @@
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from math import ceil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from zds.utils.models import Comment
+from zds.utils.templatetags.emarkdown import render_markdown, emarkdown_inline, render_cache
+from zds.utils.zmd_standin import StandInServer
+
+PARAGRAPH = (
+    "Lorem ipsum dolor sit amet, **consectetur** adipiscing elit. Sed non risus, suspendisse "
+    "[lectus tortor](https://zestedesavoir.com), dignissim sit amet, adipiscing nec, ultricies sed, dolor. "
+)
+SIGNATURE = "Mon [site web](https://zestedesavoir.com) et mon *dépôt* `git`."
+
+
+def make_markdown(size):
+    """Builds a markdown text of about ``size`` characters."""
+    paragraphs = [PARAGRAPH * 3] * max(1, size // (len(PARAGRAPH) * 3))
+    return "Salut @admin !\n\n" + "\n\n".join(paragraphs)
+
+
+def percentile(sorted_values, percent):
+    return sorted_values[max(0, ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the markdown rendering path (render_markdown, emarkdown_inline, Comment.update_content and "
+        "optionally publish_use_manifest) against a zmarkdown stand-in or a running zmarkdown server"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", help="URL of a running zmarkdown server (a stand-in is started otherwise)")
+        parser.add_argument("--latency", type=float, default=0.005, help="Latency of the stand-in (seconds)")
+        parser.add_argument("--extra-payload", type=int, default=0, help="Bytes appended by the stand-in")
+        parser.add_argument("--iterations", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=1, help="Number of threads rendering in parallel")
+        parser.add_argument("--with-cache", action="store_true", help="Keep the render cache enabled")
+        parser.add_argument("--content", type=int, help="pk of a content to benchmark publish_use_manifest with")
+
+    def handle(self, *args, **options):
+        zds_app = deepcopy(settings.ZDS_APP)
+        zds_app["zmd"]["render_cache"]["enabled"] = options["with_cache"]
+
+        server = None
+        if options["server"]:
+            zds_app["zmd"]["server"] = options["server"]
+        else:
+            server = StandInServer(("127.0.0.1", 0), latency=options["latency"], extra_payload=options["extra_payload"])
+            server.start_in_thread()
+            zds_app["zmd"]["server"] = server.url
+        self.stdout.write(f"Using the markdown server at {zds_app['zmd']['server']}")
+
+        try:
+            with override_settings(ZDS_APP=zds_app):
+                render_cache.clear()
+                self.run_benchmarks(options)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+    def run_benchmarks(self, options):
+        for name, size in (("small", 500), ("medium", 5_000), ("large", 50_000)):
+            text = make_markdown(size)
+            self.benchmark(f"render_markdown ({name})", lambda: render_markdown(text), options)
+
+        self.benchmark("emarkdown_inline (signature)", lambda: emarkdown_inline(SIGNATURE), options)
+
+        text = make_markdown(5_000)
+
+        def update_comment():
+            comment = Comment(text=text, text_metadata={"ping": ["admin"]})
+            comment.update_content(text + "\n\nEdit: @someone")
+
+        self.benchmark("Comment.update_content", update_comment, options)
+
+        if options["content"]:
+            self.benchmark_publication(options)
+
+    def benchmark_publication(self, options):
+        from zds.tutorialv2.models.database import PublishableContent
+        from zds.tutorialv2.publish_container import publish_use_manifest
+
+        try:
+            content = PublishableContent.objects.get(pk=options["content"])
+        except PublishableContent.DoesNotExist:
+            raise CommandError(f"There is no content with pk {options['content']}")
+        base_dir = tempfile.mkdtemp()
+
+        def publish():
+            # the publication alters the versioned content, so a fresh one is needed for each run
+            publish_use_manifest(content, tempfile.mkdtemp(dir=base_dir), content.load_version())
+
+        try:
+            self.benchmark(f"publish_use_manifest ({content.slug})", publish, dict(options, concurrency=1))
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    def benchmark(self, name, function, options):
+        def timed_call(_):
+            start = time.perf_counter()
+            function()
+            return time.perf_counter() - start
+
+        function()  # warm up (connections, caches)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            durations = sorted(executor.map(timed_call, range(options["iterations"])))
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            "{:<40} {:>8.1f} ops/s   p50 {:>8.2f} ms   p95 {:>8.2f} ms   p99 {:>8.2f} ms   max {:>8.2f} ms".format(
+                name,
+                len(durations) / elapsed,
+                percentile(durations, 50) * 1000,
+                percentile(durations, 95) * 1000,
+                percentile(durations, 99) * 1000,
+                durations[-1] * 1000,
+            )
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from zds.utils.zmd_standin import StandInServer
+
+
+class Command(BaseCommand):
+    help = "Run a stand-in for the zmarkdown server (naive rendering, configurable latency) for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=27272)
+        parser.add_argument("--latency", type=float, default=0.0, help="Delay added to every rendering (seconds)")
+        parser.add_argument(
+            "--latency-per-kb", type=float, default=0.0, help="Delay added per kilobyte of markdown (seconds)"
+        )
+        parser.add_argument("--extra-payload", type=int, default=0, help="Bytes appended to every rendered text")
+        parser.add_argument("--verbose", action="store_true", help="Log every request")
+
+    def handle(self, *args, **options):
+        server = StandInServer(
+            (options["host"], options["port"]),
+            latency=options["latency"],
+            latency_per_kb=options["latency_per_kb"],
+            extra_payload=options["extra_payload"],
+            verbose=options["verbose"],
+        )
+        self.stdout.write(f"zmarkdown stand-in listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("utils", "0025_move_helpwriting"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="text_metadata",
+            field=models.JSONField(blank=True, null=True, verbose_name="Métadonnées du rendu"),
+        ),
+    ]
@@ -1,9 +1,10 @@
-from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist, PermissionDenied
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext as _
 from django.conf import settings
 from zds.utils.models import Comment
+from zds.utils.templatetags.emarkdown import prerendered_markdown
 
 
 class FilterMixin:
@@ -42,6 +43,32 @@ class FilterMixin:
         return context
 
 
+class PrerenderedSignaturesMixin:
+    """
+    View mixin which renders the signatures of the authors of the displayed messages
+    at once (see ``prerendered_markdown``), rather than one by one by the
+    ``emarkdown_inline`` filter of ``misc/message.part.html``.
+    """
+
+    messages_context_name = None
+
+    def get_signatures(self, context):
+        signatures = set()
+        for message in context[self.messages_context_name]:
+            try:
+                signatures.add(message.author.profile.sign)
+            except ObjectDoesNotExist:
+                pass
+        return signatures
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        # the template has to be rendered within the block
+        with prerendered_markdown(self.get_signatures(context), inline=True):
+            response.render()
+        return response
+
+
 class QuoteMixin:
     model_quote = None
 
@@ -22,7 +22,7 @@ from zds.tutorialv2.models import TYPE_CHOICES, TYPE_CHOICES_DICT
 from zds.mp.utils import send_mp
 from zds.utils import old_slugify
 from zds.utils.misc import contains_utf8mb4
-from zds.utils.templatetags.emarkdown import render_markdown
+from zds.utils.templatetags.emarkdown import render_markdown, rendering_failed
 from zds.utils.uuslug_wrapper import uuslug
 
 from model_utils.managers import InheritanceManager
@@ -396,6 +396,8 @@ class Comment(models.Model):
 
     text = models.TextField("Texte")
     text_html = models.TextField("Texte en Html")
+    # Metadata returned by zmd when rendering `text_html` (see `update_content`), `None` if not computed yet
+    text_metadata = models.JSONField("Métadonnées du rendu", null=True, blank=True)
 
     like = models.IntegerField("Likes", default=0)
     dislike = models.IntegerField("Dislikes", default=0)
@@ -436,17 +438,40 @@ class Comment(models.Model):
         if not hasattr(self, "old_text"):
             self.old_text = self.text
 
-        _, old_metadata, _ = render_markdown(self.text)
-        html, new_metadata, _ = render_markdown(text, on_error=on_error)
-
         # These attributes will be used by `_save_compute_pings` to create notifications if needed.
         # For the same reason as `old_text`, we only update `old_metadata` if not already set.
         if not hasattr(self, "old_metadata"):
-            self.old_metadata = old_metadata
-        self.new_metadata = new_metadata
+            self.old_metadata = self.get_text_metadata()
+
+        html, new_metadata, messages = render_markdown(text, on_error=on_error)
+        failed = rendering_failed(messages)
+        if not failed:
+            # otherwise, the pings of the new text are unknown
+            self.new_metadata = new_metadata
 
         self.text = text
         self.text_html = html
+        # the metadata of a failed rendering is not stored, so that the text is rendered again by
+        # `get_text_metadata` when needed
+        self.text_metadata = None if failed else self.filter_metadata(new_metadata)
+
+    def get_text_metadata(self):
+        """
+        Returns the metadata of the current text, as stored when it was rendered. For comments rendered
+        before this metadata was stored (see the ``backfill_comments_metadata`` command), the text is
+        rendered again.
+        """
+        if self.text_metadata is not None:
+            return self.text_metadata
+        if not self.text:
+            return {}
+        _, metadata, _ = render_markdown(self.text)
+        return self.filter_metadata(metadata)
+
+    @staticmethod
+    def filter_metadata(metadata):
+        """Keeps the part of zmd metadata which is stored in ``text_metadata``."""
+        return {key: value for key, value in metadata.items() if key in ("ping", "stats")}
 
     def save(self, *args, **kwargs):
         """
@@ -470,8 +495,10 @@ class Comment(models.Model):
         """
 
         # If `update_content` was not called, there is nothing to do as the
-        # message's content stayed the same.
+        # message's content stayed the same. If the rendering of the new content
+        # failed, its pings are unknown, so nothing is done either.
         if not hasattr(self, "old_metadata") or not hasattr(self, "new_metadata"):
+            self.__dict__.pop("old_metadata", None)
             return
 
         def filter_usernames(original_list):
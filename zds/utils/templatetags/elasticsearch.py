@@ -28,7 +28,8 @@ def format_highlight(highlighted_fragments):
 
 class HighlightNode(template.Node):
     """For a elasticsearch result, looks into ``.meta.highlight`` if something has been highlighted. If so, use that
-    information. Otherwise, just give back the text.
+    information. Otherwise, just give back the text (if it was fetched, since large fields are excluded from the
+    ``_source`` of the documents).
 
     See https://www.elastic.co/guide/en/elasticsearch/reference/current/search-request-highlighting.html
 
@@ -47,12 +48,9 @@ class HighlightNode(template.Node):
         else:
             field = template.Variable(self.field).resolve(context)
 
-        if field not in search_result:
-            raise template.VariableDoesNotExist(f"field {field} is not a member of the search result")
-
         text = ""
 
-        if search_result[field]:
+        if field in search_result and search_result[field]:
             text = html_tag.sub("", search_result[field])
 
         if "highlight" in search_result.meta:
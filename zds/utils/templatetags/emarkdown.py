@@ -1,14 +1,27 @@
+import os
 import re
 import json
+import copy
+import codecs
+import hashlib
 import logging
-from requests import post, HTTPError
+import time
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager, suppress
+from functools import lru_cache
 
 from django import template
 from django.conf import settings
+from django.core.cache import caches
 from django.template.defaultfilters import stringfilter
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
+from zds.utils.cache import TwoTierCache
+from zds.utils.zmd_client import get_zmd_client, ZmdUnavailable
+
 logger = logging.getLogger(__name__)
 register = template.Library()
 """
@@ -16,7 +29,6 @@ Markdown related filters.
 """
 
 # Constants
-MAX_ATTEMPTS = 3
 MD_PARSING_ERROR = _("Une erreur est survenue dans la génération de texte Markdown. Veuillez rapporter le bug.")
 
 FORMAT_ENDPOINTS = {
@@ -27,9 +39,141 @@ FORMAT_ENDPOINTS = {
 }
 
 
+@lru_cache(maxsize=1)
+def get_zmd_version():
+    """
+    Returns the version of zmarkdown declared in ``zmd/package.json``, so that
+    cached renderings are not reused after an upgrade of the markdown server.
+    """
+    try:
+        with open(settings.BASE_DIR / "zmd" / "package.json", encoding="utf-8") as f:
+            return json.load(f)["dependencies"]["zmarkdown"]
+    except (OSError, ValueError, KeyError):
+        return "unknown"
+
+
+class RenderCache(TwoTierCache):
+    """
+    Content-addressed cache of zmarkdown renderings, configured by ``ZDS_APP["zmd"]["render_cache"]``.
+
+    Entries are ``(content, metadata, messages)`` tuples, keyed by a hash of the
+    markdown input, the output format, the options sent to zmd and the zmarkdown
+    version. Only successful renderings are stored.
+    """
+
+    def __init__(self):
+        super().__init__("zmd-render", ("zmd", "render_cache"))
+
+    def is_enabled_for(self, output_format):
+        return self.config["enabled"] and output_format in self.config["formats"]
+
+    def make_key(self, md_input, output_format, opts):
+        payload = json.dumps([str(md_input), output_format, opts, get_zmd_version()], sort_keys=True, default=str)
+        return super().make_key(hashlib.sha256(payload.encode("utf-8")).hexdigest())
+
+
+render_cache = RenderCache()
+
+
+class InflightRenders:
+    """
+    Coalesces concurrent identical renderings: while a rendering is requested to
+    zmd, the threads of the process asking for the same one wait for its result
+    instead of sending their own request.
+
+    If ``ZDS_APP["zmd"]["singleflight"]["shared_lock"]`` is set, a lock is also
+    taken in the shared tier of ``render_cache`` for cacheable renderings, so that
+    the other processes wait for the rendering to be cached rather than render it
+    too. Waiters give up after ``wait_timeout`` seconds and render it themselves.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def config(self):
+        return settings.ZDS_APP["zmd"]["singleflight"]
+
+    def do(self, key, render, *, cache_key=None):
+        """
+        Returns the result of ``render()``, or the one of the identical rendering in progress.
+
+        :param cache_key: the ``render_cache`` key under which the result will be stored, if any.
+        """
+        if not self.config["enabled"]:
+            return render()
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = Future()
+
+        if not is_leader:
+            try:
+                content, metadata, messages = call.result(timeout=self.config["wait_timeout"])
+            except FutureTimeoutError:
+                logger.warning("Timeout while waiting for an identical markdown rendering")
+                return render()
+            self.stats["coalesced"] += 1
+            return content, copy.deepcopy(metadata), copy.deepcopy(messages)
+
+        try:
+            result = self._render_once_across_workers(render, cache_key)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            content, metadata, messages = result
+            call.set_result((content, copy.deepcopy(metadata), copy.deepcopy(messages)))
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result
+
+    def _render_once_across_workers(self, render, cache_key):
+        if cache_key is None or not self.config["shared_lock"]:
+            return render()
+
+        backend = caches[render_cache.config["backend"]]
+        lock_key = f"{cache_key}:lock"
+        try:
+            acquired = backend.add(lock_key, 1, timeout=self.config["wait_timeout"])
+        except Exception:
+            logger.warning("Unable to take the markdown rendering lock", exc_info=True)
+            return render()
+
+        if not acquired:
+            deadline = time.monotonic() + self.config["wait_timeout"]
+            while time.monotonic() < deadline:
+                time.sleep(self.config["poll_interval"])
+                cached = render_cache.get(cache_key)
+                if cached is not None:
+                    self.stats["coalesced_across_workers"] += 1
+                    content, metadata, messages = cached
+                    return mark_safe(content), metadata, messages
+            return render()
+
+        try:
+            return render()
+        finally:
+            with suppress(Exception):
+                backend.delete(lock_key)
+
+
+inflight_renders = InflightRenders()
+
+
 def _render_markdown_once(md_input, *, output_format="html", **kwargs):
     """
-    Returns None on error (error details are logged). No retry mechanism.
+    Returns None as content if zmd is unavailable (error details are logged).
+    Retries are handled by the zmd client.
+
+    Successful renderings are stored in ``render_cache`` (unless ``use_cache=False``
+    is given) and served from it for the same input, format and options. Concurrent
+    identical renderings are coalesced by ``inflight_renders``.
     """
 
     def log_args():
@@ -38,57 +182,66 @@ def _render_markdown_once(md_input, *, output_format="html", **kwargs):
 
     inline = kwargs.get("inline", False) is True
     full_json = kwargs.pop("full_json", False)
+    use_cache = kwargs.pop("use_cache", True) and not full_json and render_cache.is_enabled_for(output_format)
 
     if settings.ZDS_APP["zmd"]["disable_pings"] is True:
         kwargs["disable_ping"] = True
 
-    endpoint = FORMAT_ENDPOINTS[output_format]
+    cache_key = None
+    if use_cache:
+        cache_key = render_cache.make_key(md_input, output_format, kwargs)
+        cached = render_cache.get(cache_key)
+        if cached is not None:
+            content, metadata, messages = cached
+            return mark_safe(content), metadata, messages
+
+    def request_rendering():
+        endpoint = FORMAT_ENDPOINTS[output_format]
+        client = get_zmd_client()
 
-    try:
-        timeout = 10
         real_input = str(md_input)
         if output_format.startswith("tex") or full_json:
-            # latex may be really long to generate but it is also restrained by server configuration
-            timeout = 120
             # use manifest renderer
             real_input = md_input
-        response = post(
-            "{}{}".format(settings.ZDS_APP["zmd"]["server"], endpoint),
-            json={
-                "opts": kwargs,
-                "md": real_input,
-            },
-            timeout=timeout,
-        )
-    except HTTPError:
-        logger.exception("An HTTP error happened, markdown rendering failed")
-        log_args()
-        return "", {}, []
-
-    if response.status_code == 413:
-        return "", {}, [{"message": str(_("Texte trop volumineux."))}]
-
-    if response.status_code != 200:
-        logger.error(f"The markdown server replied with status {response.status_code} (expected 200)")
-        log_args()
-        return "", {}, []
-
-    try:
-        content, metadata, messages = response.json()
-        logger.debug("Result %s, %s, %s", content, metadata, messages)
-        if messages:
-            logger.error("Markdown errors %s", json.dumps(messages))
-        if isinstance(content, str):
-            content = content.strip()
-        if inline:
-            content = content.replace("</p>\n", "\n\n").replace("\n<p>", "\n")
-        if full_json:
-            return content, metadata, messages
-        return mark_safe(content), metadata, messages
-    except:  # noqa
-        logger.exception("Unexpected exception raised")
-        log_args()
-        return "", {}, []
+        # latex may be really long to generate but it is also restrained by server configuration
+        timeout = client.timeout_for("manifest" if full_json else output_format)
+
+        try:
+            response = client.post(endpoint, {"opts": kwargs, "md": real_input}, timeout)
+        except ZmdUnavailable:
+            logger.exception("The markdown server is unavailable, markdown rendering failed")
+            log_args()
+            return None, {}, []
+
+        if response.status_code == 413:
+            return "", {}, [{"message": str(_("Texte trop volumineux."))}]
+
+        if response.status_code != 200:
+            logger.error(f"The markdown server replied with status {response.status_code} (expected 200)")
+            log_args()
+            return None, {}, []
+
+        try:
+            content, metadata, messages = response.json()
+            logger.debug("Result %s, %s, %s", content, metadata, messages)
+            if messages:
+                logger.error("Markdown errors %s", json.dumps(messages))
+            if isinstance(content, str):
+                content = content.strip()
+            if inline:
+                content = content.replace("</p>\n", "\n\n").replace("\n<p>", "\n")
+            if cache_key is not None:
+                render_cache.set(cache_key, (str(content), metadata, messages))
+            if full_json:
+                return content, metadata, messages
+            return mark_safe(content), metadata, messages
+        except:  # noqa
+            logger.exception("Unexpected exception raised")
+            log_args()
+            return None, {}, []
+
+    flight_key = render_cache.make_key(md_input, output_format, dict(kwargs, full_json=full_json))
+    return inflight_renders.do(flight_key, request_rendering, cache_key=cache_key)
 
 
 def render_markdown(md_input, *, on_error=None, disable_jsfiddle=True, **kwargs):
@@ -99,37 +252,225 @@ def render_markdown(md_input, *, on_error=None, disable_jsfiddle=True, **kwargs)
 
     Handles errors gracefully by returning an user-friendly HTML
     string which explains that the Markdown rendering has failed
-    (without any technical details).
+    (without any technical details). For other output formats, an
+    empty content is returned. In both cases, an error message is
+    returned (and given to ``on_error``), which ``rendering_failed``
+    tells apart from the warnings of a successful rendering.
 
     """
     opts = {"disable_jsfiddle": disable_jsfiddle}
     opts.update(kwargs)
-    content, metadata, messages = _render_markdown_once(md_input, **opts)
+    prerendered = _get_prerendered(md_input, opts)
+    if prerendered is not None:
+        content, metadata, messages = prerendered
+    else:
+        content, metadata, messages = _render_markdown_once(md_input, **opts)
     if messages and on_error:
         on_error([m["message"] for m in messages])
     if content is not None:
         # Success!
         return content, metadata, messages
 
-    # Oops, something went wrong
+    # Oops, zmd is unavailable (retries already happened in the client)
+    logger.error(f"md_input: {md_input!r}")
+    logger.error(f"kwargs: {kwargs!r}")
 
-    attempts = kwargs.get("attempts", 0)
-    inline = kwargs.get("inline", False) is True
+    messages = [{"message": str(MD_PARSING_ERROR), "rendering_failed": True}]
+    if on_error:
+        on_error([m["message"] for m in messages])
 
-    if attempts < MAX_ATTEMPTS:
-        if not kwargs:
-            kwargs = dict()
-        return render_markdown(md_input, **dict(kwargs, attempts=attempts + 1))
+    if kwargs.get("output_format", "html") != "html":
+        return "", metadata, messages
+    if kwargs.get("inline", False) is True:
+        return mark_safe(f"<p>{MD_PARSING_ERROR}</p>"), metadata, messages
+    return mark_safe(f'<div class="error ico-after"><p>{MD_PARSING_ERROR}</p></div>'), metadata, messages
 
-    logger.error("Max attempt count reached, giving up")
-    logger.error(f"md_input: {md_input!r}")
-    logger.error(f"kwargs: {kwargs!r}")
 
-    # FIXME: This cannot work with LaTeX.
-    if inline:
-        return mark_safe(f"<p>{json.dumps(messages)}</p>"), metadata, []
+def rendering_failed(messages):
+    """Tells whether the messages returned by ``render_markdown`` are the ones of a failed
+    rendering (zmd unavailable or in error), whose metadata is thus unknown.
+    """
+    return any(message.get("rendering_failed") for message in messages)
+
+
+def render_markdown_many(md_inputs, **kwargs):
+    """Render several markdown strings with the same options.
+
+    Returns a list of ``(rendered_content, metadata, messages)`` tuples,
+    in the order of ``md_inputs``. As zmd has no batch endpoint, distinct
+    inputs are sent in parallel over the pooled connections of the zmd
+    client, at most ``ZDS_APP["zmd"]["client"]["batch_workers"]`` at a
+    time. Identical inputs are only rendered once.
+
+    See ``render_markdown`` for the options.
+    """
+    md_inputs = [str(md_input) for md_input in md_inputs]
+    unique_inputs = list(dict.fromkeys(md_inputs))
+    workers = min(settings.ZDS_APP["zmd"]["client"]["batch_workers"], len(unique_inputs))
+
+    def render(md_input):
+        return render_markdown(md_input, **kwargs)
+
+    if workers <= 1:
+        renderings = list(map(render, unique_inputs))
     else:
-        return mark_safe(f'<div class="error ico-after"><p>{json.dumps(messages)}</p></div>'), metadata, []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            renderings = list(executor.map(render, unique_inputs))
+
+    results = dict(zip(unique_inputs, renderings))
+    return [results[md_input] for md_input in md_inputs]
+
+
+# longest prefix of the body of a JSON string which can be decoded on its own
+_JSON_STRING_BODY = re.compile(r'(?:[^"\\]+|\\u[0-9a-fA-F]{4}|\\[^u])*')
+_JSON_ARRAY_START = re.compile(r'\s*\[\s*"')
+
+
+def _write_streamed_rendering(chunks, target):
+    """
+    Writes the content of a ``[content, metadata, messages]`` zmd response to
+    ``target`` while ``chunks`` (an iterable of strings) are read, so that the
+    content is never fully held in memory.
+
+    Returns a tuple ``(written, metadata, messages)``, where ``written`` is the
+    number of characters written.
+
+    :raise ValueError: if the response is not a JSON array starting with a string.
+    """
+    chunks = iter(chunks)
+    buffer = ""
+    while not _JSON_ARRAY_START.match(buffer):
+        chunk = next(chunks, None)
+        if chunk is None or len("".join(buffer.split())) > 1:
+            raise ValueError("The rendered content is not a string")
+        buffer += chunk
+    buffer = buffer[_JSON_ARRAY_START.match(buffer).end() :]
+
+    written = 0
+    high_surrogate = ""
+    while True:
+        end = _JSON_STRING_BODY.match(buffer).end()
+        closed = end < len(buffer) and buffer[end] == '"'
+        text = json.loads('"' + buffer[:end] + '"')
+        buffer = buffer[end:]
+        if high_surrogate:
+            text = (high_surrogate + text).encode("utf-16", "surrogatepass").decode("utf-16", "surrogatepass")
+            high_surrogate = ""
+        if not closed and text and "\ud800" <= text[-1] <= "\udbff":
+            # the other half of the pair is in the next chunk
+            text, high_surrogate = text[:-1], text[-1]
+        target.write(text)
+        written += len(text)
+        if closed:
+            break
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("The rendered content is truncated")
+        buffer += chunk
+
+    # metadata and messages are small, they can be loaded at once
+    _, metadata, messages = json.loads("[null" + buffer[1:] + "".join(chunks))
+    return written, metadata, messages
+
+
+def render_markdown_to_file(md_input, target_path, *, output_format="texfile", on_error=None, **kwargs):
+    """Render a markdown string (or a manifest, for ``tex`` formats) into ``target_path``.
+
+    The rendering is written to the file while it is downloaded from zmd, in
+    chunks of ``ZDS_APP["zmd"]["client"]["stream_chunk_size"]`` bytes, so that
+    big contents are never held as a whole in memory. Renderings are not cached.
+
+    Returns a tuple ``(written, metadata, messages)``, where ``written`` is the
+    number of characters written. On failure, ``target_path`` is left untouched,
+    ``written`` is 0 and the error is reported in ``messages``, as
+    ``render_markdown`` does for formats other than HTML.
+    """
+
+    def fail(messages):
+        logger.error(f"md_input: {md_input!r}")
+        logger.error(f"kwargs: {kwargs!r}")
+        if on_error:
+            on_error([m["message"] for m in messages])
+        return 0, {}, messages
+
+    if settings.ZDS_APP["zmd"]["disable_pings"] is True:
+        kwargs["disable_ping"] = True
+
+    client = get_zmd_client()
+    real_input = md_input if output_format.startswith("tex") else str(md_input)
+    try:
+        response = client.post(
+            FORMAT_ENDPOINTS[output_format],
+            {"opts": kwargs, "md": real_input},
+            client.timeout_for(output_format),
+            stream=True,
+        )
+    except ZmdUnavailable:
+        logger.exception("The markdown server is unavailable, markdown rendering failed")
+        return fail([{"message": str(MD_PARSING_ERROR)}])
+
+    partial_path = f"{target_path}.part"
+    with response:
+        if response.status_code == 413:
+            return fail([{"message": str(_("Texte trop volumineux."))}])
+        if response.status_code != 200:
+            logger.error(f"The markdown server replied with status {response.status_code} (expected 200)")
+            return fail([{"message": str(MD_PARSING_ERROR)}])
+
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        chunk_size = client.config["stream_chunk_size"]
+        chunks = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size=chunk_size))
+        try:
+            with open(partial_path, mode="w", encoding="utf-8") as target:
+                written, metadata, messages = _write_streamed_rendering(chunks, target)
+        except:  # noqa
+            logger.exception("Unexpected exception raised")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return fail([{"message": str(MD_PARSING_ERROR)}])
+
+    os.replace(partial_path, target_path)
+    if messages:
+        logger.error("Markdown errors %s", json.dumps(messages))
+        if on_error:
+            on_error([m["message"] for m in messages])
+    return written, metadata, messages
+
+
+_prerendered = threading.local()
+
+
+def _prerendered_key(md_input, opts):
+    return json.dumps([str(md_input), opts], sort_keys=True, default=str)
+
+
+def _get_prerendered(md_input, opts):
+    renderings = getattr(_prerendered, "renderings", None)
+    if not renderings:
+        return None
+    return renderings.get(_prerendered_key(md_input, opts))
+
+
+@contextmanager
+def prerendered_markdown(md_inputs, *, disable_jsfiddle=True, **kwargs):
+    """Render ``md_inputs`` at once with ``render_markdown_many``.
+
+    Within the block, calls to ``render_markdown`` (and thus to the template
+    filters) of the current thread with the same input and options are
+    served from these renderings instead of querying zmd one by one.
+    """
+    md_inputs = [md_input for md_input in md_inputs if md_input]
+    opts = dict(kwargs, disable_jsfiddle=disable_jsfiddle)
+    renderings = render_markdown_many(md_inputs, **opts)
+
+    previous = getattr(_prerendered, "renderings", None)
+    _prerendered.renderings = dict(previous or {})
+    for md_input, rendering in zip(md_inputs, renderings):
+        _prerendered.renderings[_prerendered_key(md_input, opts)] = rendering
+    try:
+        yield
+    finally:
+        _prerendered.renderings = previous
 
 
 def render_markdown_stats(md_input, **kwargs):
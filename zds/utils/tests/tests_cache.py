@@ -0,0 +1,44 @@
+from copy import deepcopy
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from zds.utils.cache import TwoTierCache
+
+overridden_zds_app = deepcopy(settings.ZDS_APP)
+overridden_zds_app["zmd"]["render_cache"]["backend"] = "two_tier_cache_tests"
+overridden_zds_app["zmd"]["render_cache"]["local_max_entries"] = 2
+overridden_caches = dict(
+    settings.CACHES, two_tier_cache_tests={"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+)
+
+
+@override_settings(ZDS_APP=overridden_zds_app, CACHES=overridden_caches)
+class TwoTierCacheTest(TestCase):
+    def setUp(self):
+        self.cache = TwoTierCache("test", ("zmd", "render_cache"))
+        caches["two_tier_cache_tests"].clear()
+
+    def test_tiers(self):
+        key = self.cache.make_key(1, "a")
+        self.assertEqual(key, "test:1:a")
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(self.cache.stats["misses"], 1)
+
+        value = {"children": []}
+        self.cache.set(key, value)
+        value["children"].append("modified")
+        self.assertEqual(self.cache.get(key), {"children": []})
+        self.assertEqual(self.cache.stats["local_hits"], 1)
+
+        # the values evicted from the local tier are still in the shared one
+        self.cache.set(self.cache.make_key(2), 2)
+        self.cache.set(self.cache.make_key(3), 3)
+        self.assertEqual(self.cache.get(key), {"children": []})
+        self.assertEqual(self.cache.stats["shared_hits"], 1)
+
+        # the values read are copies
+        self.cache.get(key)["children"].append("modified")
+        self.assertEqual(self.cache.get(key), {"children": []})
@@ -1,10 +1,29 @@
+import json
+import time
+import tempfile
+import threading
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from pathlib import Path
 from textwrap import dedent
+from unittest import mock
 
+from django.conf import settings
+from django.core.cache import caches
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.template import Context, Template
 
-from zds.utils.templatetags.emarkdown import shift_heading
+from zds.utils.templatetags.emarkdown import (
+    shift_heading,
+    render_markdown,
+    render_markdown_many,
+    render_markdown_to_file,
+    prerendered_markdown,
+    render_cache,
+    MD_PARSING_ERROR,
+)
 
 
 class EMarkdownTest(TestCase):
@@ -108,3 +127,200 @@ class EMarkdownTest(TestCase):
         """
         )
         self.assertEqual(shift_heading(sharp_in_code_with_antiquotes, 1), result_sharp_in_code_with_antiquotes)
+
+
+overridden_zds_app = deepcopy(settings.ZDS_APP)
+overridden_zds_app["zmd"]["render_cache"]["backend"] = "render_cache_tests"
+overridden_zds_app["zmd"]["render_cache"]["enabled"] = True
+overridden_caches = dict(
+    settings.CACHES, render_cache_tests={"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+)
+
+
+@override_settings(ZDS_APP=overridden_zds_app, CACHES=overridden_caches)
+class RenderCacheTest(TestCase):
+    def setUp(self):
+        render_cache.clear()
+        caches["render_cache_tests"].clear()
+
+    def tearDown(self):
+        render_cache.clear()
+
+    @staticmethod
+    def _mock_response(status_code=200, content="<p>test</p>", metadata=None):
+        response = mock.Mock(status_code=status_code)
+        response.json = mock.Mock(return_value=[content, metadata or {"ping": ["admin"]}, []])
+        return response
+
+    @mock.patch("zds.utils.zmd_client.Session.post")
+    def test_identical_renders_are_cached(self, mock_post):
+        mock_post.return_value = self._mock_response()
+
+        first = render_markdown("test")
+        second = render_markdown("test")
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(render_cache.stats["misses"], 1)
+        self.assertEqual(render_cache.stats["local_hits"], 1)
+
+        # a different input or different options are rendered again
+        render_markdown("test 2")
+        render_markdown("test", inline=True)
+        self.assertEqual(mock_post.call_count, 3)
+
+    @mock.patch("zds.utils.zmd_client.Session.post")
+    def test_shared_tier(self, mock_post):
+        mock_post.return_value = self._mock_response()
+
+        render_markdown("test")
+        render_cache.clear()  # as if we were in another worker
+        content, metadata, _ = render_markdown("test")
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(render_cache.stats["shared_hits"], 1)
+        self.assertEqual(content, "<p>test</p>")
+        self.assertEqual(metadata, {"ping": ["admin"]})
+
+    @mock.patch("zds.utils.zmd_client.Session.post")
+    def test_cached_metadata_is_not_shared(self, mock_post):
+        mock_post.return_value = self._mock_response()
+
+        _, metadata, _ = render_markdown("test")
+        metadata["ping"].append("someone")
+        _, metadata, _ = render_markdown("test")
+
+        self.assertEqual(metadata, {"ping": ["admin"]})
+
+    @mock.patch("zds.utils.zmd_client.Session.post")
+    def test_bypass(self, mock_post):
+        mock_post.return_value = self._mock_response()
+
+        render_markdown("test", use_cache=False)
+        render_markdown("test", use_cache=False)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertNotIn("use_cache", mock_post.call_args[1]["json"]["opts"])
+
+        with self.settings(ZDS_APP=deepcopy(overridden_zds_app)):
+            settings.ZDS_APP["zmd"]["render_cache"]["enabled"] = False
+            render_markdown("test")
+            render_markdown("test")
+        self.assertEqual(mock_post.call_count, 4)
+
+    @mock.patch("zds.utils.zmd_client.Session.post")
+    def test_errors_are_not_cached(self, mock_post):
+        mock_post.return_value = self._mock_response(status_code=500)
+        render_markdown("test")
+        mock_post.return_value = self._mock_response()
+        content, _, _ = render_markdown("test")
+
+        self.assertEqual(content, "<p>test</p>")
+
+
+@mock.patch("zds.utils.zmd_client.Session.post")
+class InflightRendersTest(TestCase):
+    def test_concurrent_identical_renders_are_coalesced(self, mock_post):
+        release = threading.Event()
+
+        def slow_post(url, json=None, timeout=None, stream=False):
+            release.wait(5)
+            return RenderCacheTest._mock_response(content=f"<p>{json['md']}</p>")
+
+        mock_post.side_effect = slow_post
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(render_markdown, "test", use_cache=False) for _ in range(3)]
+            other = executor.submit(render_markdown, "other", use_cache=False)
+            while mock_post.call_count < 2:
+                time.sleep(0.01)
+            time.sleep(0.2)  # let the other threads wait for the rendering in progress
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual([content for content, _, _ in results], ["<p>test</p>"] * 3)
+        self.assertEqual(other.result()[0], "<p>other</p>")
+        # each caller gets its own metadata
+        self.assertIsNot(results[0][1], results[1][1])
+
+        render_markdown("test", use_cache=False)
+        self.assertEqual(mock_post.call_count, 3)
+
+
+def mock_zmd_post(url, json=None, timeout=None, stream=False):
+    response = mock.Mock(status_code=200)
+    response.json = mock.Mock(return_value=[f"<p>{json['md']}</p>", {}, []])
+    return response
+
+
+@mock.patch("zds.utils.zmd_client.Session.post", side_effect=mock_zmd_post)
+class RenderMarkdownManyTest(TestCase):
+    def test_render_markdown_many(self, mock_post):
+        results = render_markdown_many(["a", "b", "a", "c"], use_cache=False)
+
+        self.assertEqual([content for content, _, _ in results], ["<p>a</p>", "<p>b</p>", "<p>a</p>", "<p>c</p>"])
+        # identical inputs are only rendered once
+        self.assertEqual(mock_post.call_count, 3)
+
+    def test_prerendered_markdown(self, mock_post):
+        with prerendered_markdown(["a", "b", ""], output_format="epub", images_download_dir="/tmp"):
+            self.assertEqual(mock_post.call_count, 2)
+            content, _, _ = render_markdown("a", output_format="epub", images_download_dir="/tmp")
+            self.assertEqual(content, "<p>a</p>")
+            self.assertEqual(mock_post.call_count, 2)
+
+            # other options are not served from the prerendered contents
+            render_markdown("a", output_format="epub", images_download_dir="/somewhere/else")
+            self.assertEqual(mock_post.call_count, 3)
+
+        render_markdown("a", output_format="epub", images_download_dir="/tmp")
+        self.assertEqual(mock_post.call_count, 4)
+
+
+@mock.patch("zds.utils.zmd_client.Session.post")
+class RenderMarkdownToFileTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.target = Path(self.directory.name, "content.tex")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def _mock_response(body, status_code=200):
+        response = mock.MagicMock(status_code=status_code)
+        response.iter_content = lambda chunk_size: (body[i : i + 3] for i in range(0, len(body), 3))
+        return response
+
+    def test_render_to_file(self, mock_post):
+        # small chunks split escape sequences, surrogate pairs and multi-bytes characters
+        content = '\\documentclass{zmdocument} "é" \\\\ \u00e9 😀\n'
+        body = json.dumps([content, {"stats": {}}, []]).encode("utf-8")
+        mock_post.return_value = self._mock_response(body)
+
+        written, metadata, messages = render_markdown_to_file({"children": []}, self.target)
+
+        self.assertTrue(mock_post.call_args[1]["stream"])
+        self.assertEqual(written, len(content))
+        self.assertEqual(self.target.read_text(encoding="utf-8"), content)
+        self.assertEqual(metadata, {"stats": {}})
+        self.assertEqual(messages, [])
+
+        body = json.dumps([content, {}, []], ensure_ascii=False).encode("utf-8")
+        mock_post.return_value = self._mock_response(body)
+        render_markdown_to_file({"children": []}, self.target)
+        self.assertEqual(self.target.read_text(encoding="utf-8"), content)
+
+    def test_errors(self, mock_post):
+        mock_post.return_value = self._mock_response(b'["\\documentclass')
+        written, _, messages = render_markdown_to_file({"children": []}, self.target)
+
+        self.assertEqual(written, 0)
+        self.assertEqual(messages, [{"message": str(MD_PARSING_ERROR)}])
+        self.assertFalse(self.target.exists())
+        self.assertFalse(Path(f"{self.target}.part").exists())
+
+        mock_post.return_value = self._mock_response(b"", status_code=413)
+        written, _, messages = render_markdown_to_file({"children": []}, self.target)
+        self.assertEqual(written, 0)
+        self.assertEqual(len(messages), 1)
+        self.assertFalse(self.target.exists())
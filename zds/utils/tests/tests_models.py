@@ -1,11 +1,16 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.db import IntegrityError, transaction
 from django.contrib.auth.models import Group
 
+from zds.forum.tests.factories import create_category_and_forum, create_topic_in_forum
 from zds.member.models import Profile
 from zds.member.tests.factories import ProfileFactory
 from zds.utils.forms import TagValidator
-from zds.utils.models import Tag, Hat
+from zds.utils.models import Tag, Hat, Comment
 
 
 class TagsTests(TestCase):
@@ -100,3 +105,89 @@ class TagsTests(TestCase):
         # The user shoudn't have the hat through their profile anymore
         profile = Profile.objects.get(pk=profile.pk)  # reload
         self.assertNotIn(hat, profile.hats.all())
+
+
+def mock_zmd_post(url, json=None, timeout=None, stream=False):
+    # pings everyone whose name is prefixed with a "@", fails on texts containing "#fail"
+    # and warns about texts containing "#warn"
+    if "#fail" in json["md"]:
+        return mock.Mock(status_code=500)
+    response = mock.Mock(status_code=200)
+    pings = [word[1:] for word in json["md"].split() if word.startswith("@")]
+    messages = [{"message": "Avertissement"}] if "#warn" in json["md"] else []
+    response.json = mock.Mock(return_value=[f"<p>{json['md']}</p>", {"ping": pings}, messages])
+    return response
+
+
+@mock.patch("zds.utils.zmd_client.Session.post", side_effect=mock_zmd_post)
+class CommentMetadataTests(TestCase):
+    def setUp(self):
+        self.profile = ProfileFactory()
+        _, forum = create_category_and_forum()
+        self.topic = create_topic_in_forum(forum, self.profile)
+        self.post = self.topic.last_message
+
+    def test_metadata_is_stored(self, mock_post):
+        self.post.update_content("Salut @someone")
+        self.post.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text_metadata, {"ping": ["someone"]})
+
+    def test_old_text_is_not_rendered_again(self, mock_post):
+        self.post.update_content("Salut @someone")
+        self.post.save()
+        calls = mock_post.call_count
+
+        self.post.update_content("Salut @someone_else")
+        self.assertEqual(self.post.old_metadata, {"ping": ["someone"]})
+        self.assertEqual(mock_post.call_count, calls + 1)
+
+    def test_backfill(self, mock_post):
+        Comment.objects.filter(pk=self.post.pk).update(text="Salut @someone", text_metadata=None)
+
+        call_command("backfill_comments_metadata", stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text_metadata, {"ping": ["someone"]})
+        self.assertEqual(self.post.get_text_metadata(), {"ping": ["someone"]})
+
+    def test_metadata_of_failed_rendering_is_not_stored(self, mock_post):
+        self.post.update_content("Salut @someone")
+        self.post.save()
+
+        with mock.patch("zds.utils.models.signals.unping.send") as mock_unping:
+            self.post.update_content("Salut @someone #fail")
+            self.post.save()
+        mock_unping.assert_not_called()
+        self.post.refresh_from_db()
+        self.assertIsNone(self.post.text_metadata)
+
+        # the text is rendered again when its metadata is needed, so that nobody is pinged again
+        with mock.patch("zds.utils.models.signals.ping.send") as mock_ping:
+            self.post.update_content("Salut @someone !")
+            self.post.save()
+        mock_ping.assert_not_called()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text_metadata, {"ping": ["someone"]})
+
+    def test_metadata_of_rendering_with_warnings_is_stored(self, mock_post):
+        self.post.update_content("Salut @someone #warn")
+        self.post.save()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text_metadata, {"ping": ["someone"]})
+
+        calls = mock_post.call_count
+        with mock.patch("zds.utils.models.signals.ping.send") as mock_ping:
+            self.post.update_content("Salut @someone !")
+            self.post.save()
+        mock_ping.assert_not_called()
+        self.assertEqual(mock_post.call_count, calls + 1)  # the old text is not rendered again
+
+    def test_backfill_skips_failed_renderings(self, mock_post):
+        Comment.objects.filter(pk=self.post.pk).update(text="Salut @someone #fail", text_metadata=None)
+
+        call_command("backfill_comments_metadata", stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.assertIsNone(self.post.text_metadata)
@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.test import TestCase
+from requests import ConnectionError, Timeout
+
+from zds.utils.templatetags.emarkdown import render_markdown, MD_PARSING_ERROR
+from zds.utils.zmd_client import CircuitBreaker, ZmdUnavailable, get_zmd_client
+
+
+def mock_response(status_code=200):
+    response = mock.Mock(status_code=status_code)
+    response.json = mock.Mock(return_value=["<p>test</p>", {}, []])
+    return response
+
+
+@mock.patch("zds.utils.zmd_client.time.sleep")
+@mock.patch("zds.utils.zmd_client.Session.post")
+class ZmdClientTest(TestCase):
+    def setUp(self):
+        self.client = get_zmd_client()
+        self.client.breaker.reset()
+
+    def tearDown(self):
+        self.client.breaker.reset()
+
+    def test_retry_with_backoff(self, mock_post, mock_sleep):
+        mock_post.side_effect = [ConnectionError(), mock_response(503), mock_response()]
+
+        response = self.client.post("/html", {"md": "test", "opts": {}}, 10)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    def test_timeouts_are_not_retried(self, mock_post, mock_sleep):
+        mock_post.side_effect = Timeout()
+
+        with self.assertRaises(ZmdUnavailable):
+            self.client.post("/html", {"md": "test", "opts": {}}, 10)
+        self.assertEqual(mock_post.call_count, 1)
+
+    def test_degraded_rendering(self, mock_post, mock_sleep):
+        mock_post.side_effect = ConnectionError()
+
+        content, _, _ = render_markdown("test", use_cache=False)
+        self.assertIn(str(MD_PARSING_ERROR), content)
+        self.assertIn('class="error', content)
+
+        content, _, messages = render_markdown("test", output_format="texfile")
+        self.assertEqual(content, "")
+        self.assertEqual(messages, [{"message": str(MD_PARSING_ERROR)}])
+
+    def test_circuit_breaker_fails_fast(self, mock_post, mock_sleep):
+        mock_post.side_effect = ConnectionError()
+        threshold = self.client.breaker.failure_threshold
+
+        for _ in range(threshold):
+            with self.assertRaises(ZmdUnavailable):
+                self.client.post("/html", {"md": "test", "opts": {}}, 10)
+        self.assertTrue(self.client.breaker.is_open)
+
+        calls = mock_post.call_count
+        with self.assertRaises(ZmdUnavailable):
+            self.client.post("/html", {"md": "test", "opts": {}}, 10)
+        self.assertEqual(mock_post.call_count, calls)
+
+    @mock.patch("zds.utils.zmd_client.time.monotonic")
+    def test_unexpected_error_ends_the_trial(self, mock_monotonic, mock_post, mock_sleep):
+        mock_monotonic.return_value = 100
+        mock_post.side_effect = ConnectionError()
+        for _ in range(self.client.breaker.failure_threshold):
+            with self.assertRaises(ZmdUnavailable):
+                self.client.post("/html", {"md": "test", "opts": {}}, 10)
+
+        # the trial request fails with an error which is not a RequestException
+        mock_monotonic.return_value = 100 + self.client.breaker.cooldown + 1
+        mock_post.side_effect = TypeError("Object of type set is not JSON serializable")
+        with self.assertRaises(TypeError):
+            self.client.post("/html", {"md": "test", "opts": {}}, 10)
+
+        # it is not a failure of zmd, so that another trial is allowed right away
+        mock_post.side_effect = [mock_response()]
+        self.assertEqual(self.client.post("/html", {"md": "test", "opts": {}}, 10).status_code, 200)
+        self.assertFalse(self.client.breaker.is_open)
+
+    def test_unexpected_errors_do_not_open_the_circuit(self, mock_post, mock_sleep):
+        mock_post.side_effect = TypeError("Object of type set is not JSON serializable")
+        for _ in range(self.client.breaker.failure_threshold):
+            with self.assertRaises(TypeError):
+                self.client.post("/html", {"md": "test", "opts": {}}, 10)
+
+        self.assertEqual(self.client.breaker.failures, 0)
+        self.assertFalse(self.client.breaker.is_open)
+
+
+class CircuitBreakerTest(TestCase):
+    @mock.patch("zds.utils.zmd_client.time.monotonic")
+    def test_half_open(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+
+        # after the cooldown, a single trial request is allowed
+        mock_monotonic.return_value = 131
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+
+        # the trial failed: the circuit stays open for another cooldown
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+        mock_monotonic.return_value = 162
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertFalse(breaker.is_open)
+        self.assertTrue(breaker.allow_request())
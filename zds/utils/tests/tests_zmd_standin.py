@@ -0,0 +1,63 @@
+from copy import deepcopy
+
+from django.conf import settings
+from django.test import TestCase
+
+from zds.utils.templatetags.emarkdown import render_markdown
+from zds.utils.zmd_standin import StandInServer
+
+
+class ZmdStandInTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StandInServer(("127.0.0.1", 0))
+        cls.server.start_in_thread()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        zds_app = deepcopy(settings.ZDS_APP)
+        zds_app["zmd"]["server"] = self.server.url
+        self.settings_override = self.settings(ZDS_APP=zds_app)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def test_render_html(self):
+        content, metadata, messages = render_markdown("Salut @admin et @**Super Admin** !\n\n<b>test</b>")
+
+        self.assertEqual(content, "<p>Salut @admin et @**Super Admin** !</p>\n<p>&lt;b&gt;test&lt;/b&gt;</p>")
+        self.assertEqual(metadata, {"ping": ["admin", "Super Admin"]})
+        self.assertEqual(messages, [])
+
+        _, metadata, _ = render_markdown("Salut @admin", disable_ping=True)
+        self.assertEqual(metadata, {})
+
+    def test_render_manifest(self):
+        manifest = {
+            "title": "Tutoriel",
+            "introduction": "Introduction",
+            "conclusion": "Conclusion",
+            "children": [{"title": "Extrait", "text": "Texte"}],
+        }
+        content, metadata, _ = render_markdown(manifest, full_json=True, stats=True)
+
+        self.assertEqual(content["introduction"], "<p>Introduction</p>")
+        self.assertEqual(content["children"][0]["text"], "<p>Texte</p>")
+        self.assertEqual(content["children"][0]["title"], "Extrait")
+        self.assertEqual(metadata["stats"]["signs"], len("IntroductionConclusionTexte"))
+
+    def test_too_large(self):
+        self.server.max_body_size = 10
+        try:
+            content, _, messages = render_markdown("This text is too large")
+        finally:
+            self.server.max_body_size = 64 * 1024 * 1024
+        self.assertEqual(content, "")
+        self.assertEqual(len(messages), 1)
@@ -0,0 +1,161 @@
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from requests import Session, RequestException, Timeout
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRIED_STATUS_CODES = (502, 503, 504)
+
+
+class ZmdUnavailable(Exception):
+    """Raised when the zmarkdown server cannot be reached, or when the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to zmd once ``failure_threshold`` consecutive failures
+    happened. After ``cooldown`` seconds, a single trial request is let through:
+    the circuit closes again if it succeeds, and stays open for another cooldown
+    otherwise.
+    """
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_in_progress or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("The markdown server is reachable again, closing the circuit")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_progress = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error(f"{self.failures} consecutive failures of the markdown server, opening the circuit")
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Ends the trial request without counting it as a failure of zmd, e.g. after an error of the client."""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def reset(self):
+        self.record_success()
+
+
+class ZmdClient:
+    """
+    HTTP client for the zmarkdown server.
+
+    It keeps a pool of keep-alive connections (``ZDS_APP["zmd"]["client"]["pool_size"]``
+    per process), retries connection errors and gateway errors with an exponential
+    backoff and jitter, and fails fast through a circuit breaker while zmd is down.
+    Timeouts are not retried, as they mostly mean that zmd is already overloaded.
+    """
+
+    def __init__(self):
+        config = self.config
+        self.session = Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config["pool_size"], max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breaker = CircuitBreaker(config["breaker_failure_threshold"], config["breaker_cooldown"])
+
+    @property
+    def config(self):
+        return settings.ZDS_APP["zmd"]["client"]
+
+    def timeout_for(self, output_format):
+        return self.config["timeouts"][output_format]
+
+    def backoff_delay(self, attempt):
+        """Full jitter: a random delay up to ``backoff_base * 2 ** attempt``, capped to ``backoff_max``."""
+        return random.uniform(0, min(self.config["backoff_max"], self.config["backoff_base"] * 2**attempt))
+
+    def post(self, endpoint, payload, timeout, stream=False):
+        """
+        Sends ``payload`` to ``endpoint`` and returns the response.
+
+        With ``stream=True``, the body is not downloaded up front: the caller has to consume
+        it (e.g. with ``response.iter_content()``) and close the response.
+
+        :raise ZmdUnavailable: if the circuit is open or if zmd could not be reached after all attempts.
+        """
+        if not self.breaker.allow_request():
+            raise ZmdUnavailable("The circuit breaker is open")
+
+        url = "{}{}".format(settings.ZDS_APP["zmd"]["server"], endpoint)
+        max_attempts = self.config["max_attempts"]
+
+        try:
+            for attempt in range(max_attempts):
+                try:
+                    response = self.session.post(url, json=payload, timeout=timeout, stream=stream)
+                except Timeout as e:
+                    self.breaker.record_failure()
+                    raise ZmdUnavailable(f"The markdown server did not answer in {timeout}s") from e
+                except RequestException as e:
+                    logger.warning(f"Unable to reach the markdown server (attempt {attempt + 1}/{max_attempts}): {e}")
+                    error = e
+                else:
+                    if response.status_code not in RETRIED_STATUS_CODES:
+                        self.breaker.record_success()
+                        return response
+                    logger.warning(f"The markdown server replied with status {response.status_code}")
+                    response.close()
+                    error = None
+
+                if attempt + 1 < max_attempts:
+                    time.sleep(self.backoff_delay(attempt))
+
+            self.breaker.record_failure()
+            raise ZmdUnavailable(f"The markdown server is unavailable after {max_attempts} attempts") from error
+        except ZmdUnavailable:
+            raise
+        except BaseException:
+            # any other error (e.g. a payload which cannot be encoded) is not a failure of zmd,
+            # but must not leave a trial request in progress
+            self.breaker.release_trial()
+            raise
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_zmd_client():
+    """Returns the zmd client of the current process."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ZmdClient()
+    return _client
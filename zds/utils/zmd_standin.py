@@ -0,0 +1,135 @@
+"""
+A stand-in for the zmarkdown server, to measure and test the markdown rendering path of zds without
+running the Node.js server.
+
+It speaks the same protocol as the endpoints of ``FORMAT_ENDPOINTS`` (a JSON body ``{"md": ..., "opts": ...}``
+answered by ``[content, metadata, messages]``) but only performs a naive conversion of the markdown. An artificial
+latency and extra payload can be added to each response to mimic a real server under load.
+"""
+import html
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PING_PATTERN = re.compile(r"(?<![\w@])@(?:\*\*(?P<long>[^*]+)\*\*|(?P<short>[\w.+-]+))")
+RENDERED_MANIFEST_KEYS = ("introduction", "conclusion", "text")
+
+
+def render_text(md_input, output_format, opts):
+    """Returns a naive rendering of ``md_input`` along with the metadata that zmd would compute."""
+    metadata = {}
+    if not opts.get("disable_ping", False):
+        pings = [match.group("long") or match.group("short") for match in PING_PATTERN.finditer(md_input)]
+        if pings:
+            metadata["ping"] = pings
+    if opts.get("stats", False):
+        metadata["stats"] = {"signs": len(md_input), "words": len(md_input.split())}
+
+    paragraphs = [html.escape(paragraph.strip()) for paragraph in md_input.split("\n\n") if paragraph.strip()]
+    if output_format == "html" or output_format == "epub":
+        content = "\n".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    else:
+        content = "\n\n".join(paragraphs)
+        if output_format == "texfile":
+            content = f"\\documentclass{{zmdocument}}\n\\begin{{document}}\n{content}\n\\end{{document}}"
+    return content, metadata
+
+
+def render_manifest(manifest, output_format, opts):
+    """Renders the texts of an exported content (see ``export_content``) in place, like zmd does."""
+    metadata = {"stats": {"signs": 0, "words": 0}}
+    rendered = dict(manifest)
+    for key in RENDERED_MANIFEST_KEYS:
+        if isinstance(rendered.get(key), str):
+            rendered[key], text_metadata = render_text(rendered[key], output_format, dict(opts, stats=True))
+            metadata["stats"]["signs"] += text_metadata["stats"]["signs"]
+            metadata["stats"]["words"] += text_metadata["stats"]["words"]
+    children = []
+    for child in rendered.get("children", []):
+        rendered_child, child_metadata = render_manifest(child, output_format, opts)
+        metadata["stats"]["signs"] += child_metadata["stats"]["signs"]
+        metadata["stats"]["words"] += child_metadata["stats"]["words"]
+        children.append(rendered_child)
+    rendered["children"] = children
+    return rendered, metadata
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    endpoints = {"/html": "html", "/latex": "tex", "/latex-document": "texfile", "/epub": "epub"}
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_body(200, b"zmd stand-in is running")
+
+    def do_POST(self):
+        output_format = self.endpoints.get(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if output_format is None:
+            self.send_body(404, b"not found")
+            return
+        if len(body) > self.server.max_body_size:
+            self.send_body(413, b"payload too large")
+            return
+
+        payload = json.loads(body)
+        md_input, opts = payload.get("md", ""), payload.get("opts", {})
+        if isinstance(md_input, dict):
+            content, metadata = render_manifest(md_input, output_format, opts)
+        else:
+            content, metadata = render_text(str(md_input), output_format, opts)
+            if self.server.extra_payload:
+                content += f"\n<!-- {'x' * self.server.extra_payload} -->"
+
+        time.sleep(self.server.latency + self.server.latency_per_kb * len(body) / 1024)
+        self.send_body(200, json.dumps([content, metadata, []]).encode("utf-8"), "application/json")
+
+    def send_body(self, status, body, content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    :param latency: fixed delay added to every rendering, in seconds
+    :param latency_per_kb: delay added per kilobyte of request body, in seconds
+    :param extra_payload: number of bytes appended to every rendered text
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 27272),
+        latency=0.0,
+        latency_per_kb=0.0,
+        extra_payload=0,
+        max_body_size=64 * 1024 * 1024,
+        verbose=False,
+    ):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.latency_per_kb = latency_per_kb
+        self.extra_payload = extra_payload
+        self.max_body_size = max_body_size
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start_in_thread(self):
+        """Serves requests in a background thread, and returns this thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread